@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+import contextvars
+from datetime import datetime, timezone
+from sqlalchemy.engine import make_url
+
+# Навантажувальний бенчмарк: наповнює локальну SQLite / Postgres синтетичними
+# користувачами й записами та ганяє справжній ASGI-додаток конкурентними клієнтами
+# (httpx + ASGITransport, без мережі). Для кожного маршруту рахує пропускну здатність,
+# p50/p95/p99 та кількість SQL-запитів; результат пишеться в JSON для порівняння запусків.
+#
+#   python benchmark.py --users 200 --items-per-user 100 --share-ratio 0.3 --duration 20
+#   python benchmark.py --compare benchmarks/20260101-120000.json
+#
+# Усі налаштування додатку (DB_URL, BCRYPT_ROUNDS, FEED_CACHE_TTL ...) читаються з оточення,
+# тому модулі додатку імпортуються лише після того, як бенчмарк виставив DB_URL.
+
+BENCH_PASSWORD = "bench-password"
+SEED_CHUNK_SIZE = 5000
+WORDS = (
+    "dune", "matrix", "witcher", "potter", "odyssey", "galaxy", "shadow", "river", "winter", "empire",
+    "dragon", "ocean", "silent", "forest", "city", "night", "storm", "garden", "mirror", "legend",
+)
+SCENARIOS = ("home", "feed", "catalog", "search", "api", "login", "register")
+
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк маршрутів GlobiFy")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DB_URL", "sqlite:///bench.db"), help="база для бенчмарку (не робоча!)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--items-per-user", type=int, default=50)
+    parser.add_argument("--share-ratio", type=float, default=0.2, help="частка поширених записів, 0..1")
+    parser.add_argument("--concurrency", type=int, default=10, help="кількість одночасних клієнтів")
+    parser.add_argument("--duration", type=float, default=10.0, help="тривалість заміру, секунд")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"через кому з: {', '.join(SCENARIOS)}")
+    parser.add_argument("--reset", action="store_true", help="очистити базу та наповнити заново")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора даних і сценаріїв")
+    parser.add_argument("--output", default=None, help="файл результату (типово benchmarks/<час>.json)")
+    parser.add_argument("--compare", default=None, help="попередній результат для порівняння")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустиме погіршення p95 / пропускної здатності")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"невідомі сценарії: {', '.join(sorted(unknown))}")
+    return args
+
+
+def prepare_environment(args):
+    url = make_url(args.db_url)
+    if args.reset and url.drivername.startswith("sqlite") and url.database and os.path.exists(url.database):
+        os.remove(url.database)
+    os.environ["DB_URL"] = args.db_url
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    # Листи реєстрації не повинні йти в реальний SMTP
+    os.environ.setdefault("SMTP_HOST", "127.0.0.1")
+    os.environ.setdefault("SMTP_PORT", "9")
+    # Сценарії login/register б'ють з однієї адреси — ліміт частоти спотворив би заміри
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+
+# --- Наповнення бази ---
+def seed_database(args):
+    from sqlalchemy import text, insert, func, select
+    from database import engine
+    from models import UserDB, ItemDB, CatalogStatsDB, OutboxEmailDB, CATEGORIES
+    from passwords import pwd_context
+    from catalog_stats import reconcile_catalog_stats
+    from migrations import init_schema
+
+    init_schema(engine)
+
+    with engine.begin() as conn:
+        if args.reset and engine.dialect.name != "sqlite":
+            for table in (ItemDB, CatalogStatsDB, OutboxEmailDB, UserDB):
+                conn.execute(table.__table__.delete())
+        existing = conn.scalar(select(func.count()).select_from(UserDB))
+    if existing:
+        print(f"ℹ️ База вже наповнена ({existing} користувачів) — використовуємо як є. Для нового наповнення: --reset")
+        return
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    # Один хеш на всіх: bcrypt на кожного користувача зайняв би більше часу, ніж сам бенчмарк
+    hashed_password = pwd_context.hash(BENCH_PASSWORD)
+    users = [
+        {"username": f"bench_{n}", "email": f"bench_{n}@example.com", "hashed_password": hashed_password,
+         "is_verified": True, "verify_token": "", "avatar_url": "", "bio": ""}
+        for n in range(args.users)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(UserDB), users)
+        user_ids = list(conn.execute(select(UserDB.id).order_by(UserDB.id)).scalars())
+
+    rows = []
+    total = 0
+    for owner_id in user_ids:
+        for _ in range(args.items_per_user):
+            rows.append({
+                "category": rng.choice(CATEGORIES),
+                "title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.randint(1, 9999)}",
+                "author": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                "rating": round(rng.uniform(1, 10), 1),
+                "link": "",
+                "image_url": "",
+                "is_shared": rng.random() < args.share_ratio,
+                "owner_id": owner_id,
+            })
+            if len(rows) >= SEED_CHUNK_SIZE:
+                with engine.begin() as conn:
+                    conn.execute(insert(ItemDB), rows)
+                total += len(rows)
+                rows = []
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(insert(ItemDB), rows)
+        total += len(rows)
+    with engine.begin() as conn:
+        # Лічильники головної сторінки ведуться в catalog_stats — заповнюємо їх звіркою
+        reconcile_catalog_stats(conn)
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE"))
+    print(f"🌱 Наповнено: {len(user_ids)} користувачів, {total} записів за {time.perf_counter() - started:.1f} с")
+
+
+# --- Статистика ---
+def percentile(sorted_values, fraction: float):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.queries = 0
+
+    def summary(self, elapsed: float):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": to_ms(sum(latencies) / count) if count else None,
+            "p50_ms": to_ms(percentile(latencies, 0.50)),
+            "p95_ms": to_ms(percentile(latencies, 0.95)),
+            "p99_ms": to_ms(percentile(latencies, 0.99)),
+            "max_ms": to_ms(latencies[-1]) if count else None,
+            "queries_per_request": round(self.queries / count, 2) if count else None,
+        }
+
+
+# --- Клієнти ---
+class BenchClient:
+    def __init__(self, client, rng, stats, usernames):
+        self.client = client
+        self.rng = rng
+        self.stats = stats
+        self.usernames = usernames
+
+    async def request(self, route: str, method: str, url: str, **kwargs):
+        token = current_route.set(route)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_route.reset(token)
+        stats = self.stats.setdefault(route, RouteStats())
+        stats.latencies.append(elapsed)
+        if response.status_code >= 400:
+            stats.errors += 1
+        return response
+
+    async def login(self):
+        username = self.rng.choice(self.usernames)
+        return await self.request("POST /login", "POST", "/login", data={"username": username, "password": BENCH_PASSWORD})
+
+    async def run_scenario(self, name: str, categories):
+        category = self.rng.choice(categories)
+        if name == "home":
+            await self.request("GET /", "GET", "/")
+        elif name == "feed":
+            await self.request("GET /feed/{category}", "GET", f"/feed/{category}")
+        elif name == "catalog":
+            await self.request("GET /catalog/{category}", "GET", f"/catalog/{category}")
+        elif name == "search":
+            await self.request("GET /search", "GET", "/search", params={"q": self.rng.choice(WORDS)[:4]})
+        elif name == "api":
+            await self.request("GET /api/v1/catalog/{category}", "GET", f"/api/v1/catalog/{category}")
+        elif name == "login":
+            await self.login()
+        elif name == "register":
+            suffix = f"{os.getpid()}_{time.time_ns()}_{self.rng.randint(0, 10**6)}"
+            await self.request("POST /register", "POST", "/register", data={
+                "username": f"bench_new_{suffix}", "email": f"bench_new_{suffix}@example.com", "password": BENCH_PASSWORD,
+            })
+
+
+async def drive(app, args, usernames, stats):
+    import httpx
+    from models import CATEGORIES
+
+    async def worker(number: int):
+        rng = random.Random(args.seed * 1000 + number)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", follow_redirects=False) as client:
+            bench_client = BenchClient(client, rng, stats, usernames)
+            await bench_client.login()
+            while time.perf_counter() < deadline:
+                await bench_client.run_scenario(rng.choice(args.scenarios), CATEGORIES)
+
+    # Логіни на старті теж потрапляють у статистику POST /login
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(worker(number) for number in range(args.concurrency)))
+    return time.perf_counter() - started
+
+
+def install_query_counter(stats):
+    from sqlalchemy import event
+    from database import async_engine
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        route = current_route.get()
+        if route:
+            stats.setdefault(route, RouteStats()).queries += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_query)
+
+
+async def run_benchmark(args):
+    from sqlalchemy import select
+    import main
+    from database import AsyncSessionLocal
+    from models import UserDB
+
+    seed_database(args)
+    async with AsyncSessionLocal() as db:
+        usernames = list(await db.scalars(select(UserDB.username).where(UserDB.username.like("bench\\_%", escape="\\"), UserDB.is_verified == True)))
+    if not usernames:
+        raise SystemExit("❌ У базі немає користувачів бенчмарку (bench_*). Запустіть з --reset.")
+
+    async with main.app.router.lifespan_context(main.app):
+        route_stats = {}
+        install_query_counter(route_stats)
+        elapsed = await drive(main.app, args, usernames, route_stats)
+    return route_stats, elapsed
+
+
+# --- Звіт ---
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args, route_stats, elapsed):
+    routes = {route: stats.summary(elapsed) for route, stats in sorted(route_stats.items())}
+    total_requests = sum(route["requests"] for route in routes.values())
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "database": make_url(args.db_url).get_backend_name(),
+        "config": {
+            "users": args.users,
+            "items_per_user": args.items_per_user,
+            "share_ratio": args.share_ratio,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "scenarios": args.scenarios,
+            "seed": args.seed,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": {
+            "requests": total_requests,
+            "errors": sum(route["errors"] for route in routes.values()),
+            "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        },
+        "routes": routes,
+    }
+
+
+def print_report(report):
+    print(f"\n{'маршрут':<34}{'запитів':>9}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'SQL/зап':>9}{'помилок':>9}")
+    for route, stats in report["routes"].items():
+        print(f"{route:<34}{stats['requests']:>9}{stats['throughput_rps']:>9}{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['queries_per_request']:>9}{stats['errors']:>9}")
+    total = report["total"]
+    print(f"\nУсього: {total['requests']} запитів, {total['throughput_rps']} rps, помилок: {total['errors']}")
+
+
+def compare_reports(previous, current, tolerance: float):
+    # Регресія: p95 зріс або пропускна здатність впала більше ніж на tolerance
+    regressions = []
+    print(f"\nПорівняння з {previous.get('revision') or '?'} ({previous.get('started_at')}):")
+    for route, stats in current["routes"].items():
+        before = previous.get("routes", {}).get(route)
+        if not before or not before.get("p95_ms") or not stats.get("p95_ms"):
+            continue
+        p95_change = stats["p95_ms"] / before["p95_ms"] - 1
+        rps_change = stats["throughput_rps"] / before["throughput_rps"] - 1 if before["throughput_rps"] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance
+        marker = "❌" if regressed else "✅"
+        print(f"{marker} {route:<34} p95 {before['p95_ms']} → {stats['p95_ms']} мс ({p95_change:+.0%}), rps {rps_change:+.0%}")
+        if regressed:
+            regressions.append(route)
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    prepare_environment(args)
+    route_stats, elapsed = asyncio.run(run_benchmark(args))
+    report = build_report(args, route_stats, elapsed)
+    print_report(report)
+
+    output = args.output or os.path.join("benchmarks", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Результат збережено: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_reports(json.load(f), report, args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import os
+import io
+import csv
+import json
+import asyncio
+from collections import Counter
+from fastapi import UploadFile
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from models import ItemDB, CATEGORIES
+from catalog_stats import bump_catalog_version, item_deltas
+from feed_cache import feed_cache
+
+# Масовий імпорт/експорт каталогу користувача (CSV або JSON Lines).
+# Імпорт читає файл порціями і вставляє рядки пакетами, кожен пакет — окрема транзакція.
+# Експорт стрімить записи курсором, не тримаючи весь каталог у пам'яті.
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Скільки помилок повертати поіменно; решта лише рахується
+MAX_REPORTED_ERRORS = 100
+FIELDS = ("category", "title", "author", "rating", "link", "image_url", "is_shared")
+TRUE_VALUES = {"1", "true", "yes", "так"}
+
+
+def detect_format(filename: str, requested: str = ""):
+    if requested in ("csv", "jsonl"):
+        return requested
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    return "jsonl" if extension in ("jsonl", "ndjson", "json") else "csv"
+
+
+def _read_records(text_stream, file_format: str):
+    # Генератор (номер_рядка, dict або Exception) — пам'ять не залежить від розміру файлу
+    if file_format == "csv":
+        reader = csv.DictReader(text_stream)
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # Поле понад ліміт csv, NUL-байт тощо: позиція розбору вже невизначена,
+                # тож далі файл не читаємо — вставлене до цього місця лишається
+                yield None, ValueError(f"некоректний CSV після рядка {reader.line_num} ({e}), решту файлу пропущено")
+                return
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"некоректний JSON: {e}")
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError("очікувався JSON-об'єкт")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def validate_record(record: dict, owner_id: int, default_category: str = None):
+    category = str(record.get("category") or default_category or "").strip()
+    if category not in CATEGORIES:
+        raise ValueError(f"невідома категорія «{category}»")
+    title = str(record.get("title") or "").strip()
+    author = str(record.get("author") or "").strip()
+    if not title or not author:
+        raise ValueError("назва та автор обов'язкові")
+    link, image_url = str(record.get("link") or ""), str(record.get("image_url") or "")
+    # NUL у тексті Postgres не приймає, а csv у Python 3.11+ його вже пропускає
+    if any("\0" in value for value in (category, title, author, link, image_url)):
+        raise ValueError("текст містить NUL-байт")
+    try:
+        rating = float(record.get("rating"))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("рейтинг має бути числом")
+    if not 1 <= rating <= 10:
+        raise ValueError("рейтинг має бути від 1 до 10")
+    return {
+        "category": category,
+        "title": title,
+        "author": author,
+        "rating": rating,
+        "link": link,
+        "image_url": image_url,
+        "is_shared": _parse_bool(record.get("is_shared")),
+        "owner_id": owner_id,
+    }
+
+
+async def import_items(db: AsyncSession, upload: UploadFile, owner_id: int, file_format: str, default_category: str = None):
+    # Повертає звіт: скільки вставлено, скільки відхилено і перші помилки з номерами рядків
+    report = {"imported": 0, "failed": 0, "errors": []}
+    shared_categories = set()
+    text_stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    records = _read_records(text_stream, file_format)
+
+    def next_chunk():
+        # Виконується в потоці: читання та розбір файлу з диска не блокують event loop
+        chunk = []
+        for line_number, record in records:
+            chunk.append((line_number, record))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                break
+        return chunk
+
+    try:
+        while chunk := await asyncio.to_thread(next_chunk):
+            rows = []
+            for line_number, record in chunk:
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    rows.append(validate_record(record, owner_id, default_category))
+                except ValueError as e:
+                    report["failed"] += 1
+                    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                        report["errors"].append({"line": line_number, "error": str(e)})
+            if rows:
+                # Один INSERT ... VALUES на пакет (executemany) і один commit
+                await db.execute(insert(ItemDB), rows)
+                await bump_catalog_version(db, owner_id, sum((item_deltas(row["category"], row["is_shared"]) for row in rows), Counter()))
+                await db.commit()
+                report["imported"] += len(rows)
+                shared_categories.update(row["category"] for row in rows if row["is_shared"])
+    except UnicodeDecodeError:
+        report["errors"].append({"line": None, "error": "файл має бути в кодуванні UTF-8"})
+    finally:
+        text_stream.detach()
+        # Закомічені пакети лишаються в БД навіть якщо імпорт обірвався — стрічку оновлюємо завжди
+        for category in shared_categories:
+            feed_cache.invalidate(category)
+    return report
+
+
+async def export_items(owner_id: int, file_format: str):
+    # Окрема сесія: сесія з Depends закривається раніше, ніж відповідь дострімиться
+    async with AsyncSessionLocal() as db:
+        query = (
+            select(*(getattr(ItemDB, field) for field in FIELDS))
+            .where(ItemDB.owner_id == owner_id)
+            .order_by(ItemDB.category, ItemDB.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        result = await db.stream(query)
+        if file_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(FIELDS)
+            async for partition in result.partitions():
+                writer.writerows(partition)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            async for partition in result.partitions():
+                yield "".join(json.dumps(dict(row._mapping), ensure_ascii=False) + "\n" for row in partition)
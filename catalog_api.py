@@ -0,0 +1,73 @@
+import os
+from fastapi import Request
+from sqlalchemy import select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import ItemDB
+from dashboard import encode_feed_cursor
+
+# JSON API v1 над каталогами: keyset-пагінація за (rating, id) DESC, вибір полів
+# через ?fields=title,rating та умовні запити за версією каталогу (catalog_stats).
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "50"))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "500"))
+API_FIELDS = ("id", "category", "title", "author", "rating", "link", "image_url", "is_shared")
+API_CACHE_CONTROL = "private, no-cache"
+
+
+def parse_fields(fields: str = None):
+    if not fields:
+        return API_FIELDS
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in API_FIELDS]
+    if unknown or not requested:
+        raise ValueError(f"Невідомі поля: {', '.join(unknown)}. Доступні: {', '.join(API_FIELDS)}")
+    return requested
+
+
+def item_to_dict(item, fields=API_FIELDS):
+    data = {field: getattr(item, field) for field in fields}
+    # SQLite у RETURNING віддає 5.0 як 5 — тримаємо тип рейтингу стабільним
+    if data.get("rating") is not None:
+        data["rating"] = float(data["rating"])
+    return data
+
+
+# --- Валідатори кешу ---
+def catalog_validators(stats):
+    # Версія унікальна лише в межах користувача, тому owner_id входить в ETag.
+    # Last-Modified не віддаємо: точність у секунду дала б хибний 304 після
+    # другої зміни в ту саму секунду, а версія змінюється з кожною
+    return {"ETag": f'"c{stats.owner_id}.{stats.version}"', "Cache-Control": API_CACHE_CONTROL}
+
+def is_not_modified(request: Request, headers: dict):
+    # Лише If-None-Match: If-Modified-Since без Last-Modified ігнорується (RFC 9110, 13.1.3)
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or headers["ETag"] in tags
+
+
+# --- Вибірки ---
+async def load_items_page(db: AsyncSession, owner_id: int, category: str, fields, position=None, limit: int = API_PAGE_SIZE):
+    # rating та id вибираються завжди — з них будується курсор наступної сторінки
+    columns = dict.fromkeys((*fields, "rating", "id"))
+    query = (
+        select(*(getattr(ItemDB, field) for field in columns))
+        .where(ItemDB.owner_id == owner_id, ItemDB.category == category)
+        .order_by(ItemDB.rating.desc(), ItemDB.id.desc())
+        .limit(limit + 1)
+    )
+    if position:
+        rating, item_id = position
+        query = query.where(or_(ItemDB.rating < rating, and_(ItemDB.rating == rating, ItemDB.id < item_id)))
+    rows = (await db.execute(query)).all()
+    page, extra = rows[:limit], rows[limit:]
+    next_cursor = encode_feed_cursor(page[-1]) if extra else None
+    return [{field: getattr(row, field) for field in fields} for row in page], next_cursor
+
+async def load_item(db: AsyncSession, owner_id: int, category: str, item_id: int, fields):
+    query = select(*(getattr(ItemDB, field) for field in fields)).where(
+        ItemDB.id == item_id, ItemDB.owner_id == owner_id, ItemDB.category == category
+    )
+    row = (await db.execute(query)).first()
+    return dict(row._mapping) if row else None
@@ -0,0 +1,126 @@
+import os
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
+from models import ItemDB, CatalogStatsDB, CATEGORIES
+
+# Версія та лічильники каталогу користувача. Кожна зміна його записів (add / edit / share /
+# delete / import) збільшує версію і коригує лічильники в тій самій транзакції, тож
+# клієнт API перевіряє актуальність, а головна сторінка читає статистику одним пошуком
+# за первинним ключем, не рахуючи самих записів. Розбіжності виправляє reconcile_catalog_stats.
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "3600"))
+COUNT_COLUMNS = tuple(f"{category}_count" for category in CATEGORIES) + tuple(f"{category}_shared" for category in CATEGORIES)
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def item_deltas(category: str, is_shared: bool, sign: int = 1):
+    # Зміни лічильників від додавання (sign=1) або видалення (sign=-1) одного запису
+    deltas = Counter({f"{category}_count": sign})
+    if is_shared:
+        deltas[f"{category}_shared"] += sign
+    return deltas
+
+
+async def bump_catalog_version(db: AsyncSession, owner_id: int, deltas: Counter = None):
+    # Атомарний upsert: рядок з'являється при першій зміні, далі version + 1 і лічильники += delta.
+    # Комітить викликач разом із самою зміною.
+    deltas = {column: delta for column, delta in (deltas or {}).items() if delta}
+    now = utcnow()
+    insert_statement = UPSERT_DIALECTS[db.bind.dialect.name]
+    statement = insert_statement(CatalogStatsDB).values(owner_id=owner_id, version=1, updated_at=now, **deltas)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CatalogStatsDB.owner_id],
+        set_={
+            "version": CatalogStatsDB.version + 1,
+            "updated_at": now,
+            **{column: getattr(CatalogStatsDB, column) + delta for column, delta in deltas.items()},
+        },
+    )
+    await db.execute(statement)
+
+
+async def load_catalog_stats(db: AsyncSession, owner_id: int):
+    # Користувач без жодної зміни ще не має рядка — для нього версія 0 і порожні лічильники
+    stats = await db.get(CatalogStatsDB, owner_id)
+    return stats or CatalogStatsDB(owner_id=owner_id, version=0, updated_at=None, **dict.fromkeys(COUNT_COLUMNS, 0))
+
+
+def category_counts(stats):
+    return {category: getattr(stats, f"{category}_count") for category in CATEGORIES}
+
+def shared_counts(stats):
+    return {category: getattr(stats, f"{category}_shared") for category in CATEGORIES}
+
+
+# --- Звірка з items ---
+def _count_items(conn, owner_id: int = None):
+    # {owner_id: {колонка: значення}} за фактичними записами items
+    actual = {}
+    query = select(ItemDB.owner_id, ItemDB.category, ItemDB.is_shared, func.count().label("total")).group_by(ItemDB.owner_id, ItemDB.category, ItemDB.is_shared)
+    if owner_id is not None:
+        query = query.where(ItemDB.owner_id == owner_id)
+    for row in conn.execute(query):
+        if row.category not in CATEGORIES:
+            continue
+        counts = actual.setdefault(row.owner_id, dict.fromkeys(COUNT_COLUMNS, 0))
+        counts[f"{row.category}_count"] += row.total
+        if row.is_shared:
+            counts[f"{row.category}_shared"] += row.total
+    return actual
+
+
+def _repair_owner(conn, owner_id: int):
+    # Рядок статистики блокується (FOR UPDATE) до перерахунку: зміни, закомічені раніше,
+    # уже видно новому запиту (READ COMMITTED), а пізніші чекають на блокування
+    # і додають свою дельту вже до виправленого значення
+    upsert = UPSERT_DIALECTS[conn.dialect.name]
+    conn.execute(upsert(CatalogStatsDB).values(owner_id=owner_id, version=0, updated_at=utcnow()).on_conflict_do_nothing(index_elements=[CatalogStatsDB.owner_id]))
+    conn.execute(select(CatalogStatsDB.owner_id).where(CatalogStatsDB.owner_id == owner_id).with_for_update())
+    counts = _count_items(conn, owner_id).get(owner_id, dict.fromkeys(COUNT_COLUMNS, 0))
+    conn.execute(update(CatalogStatsDB).where(CatalogStatsDB.owner_id == owner_id).values(**counts))
+
+
+def reconcile_catalog_stats(conn):
+    # Перераховує лічильники з items і виправляє лише розбіжні рядки (синхронне з'єднання:
+    # викликається з міграції, з фонового завдання та з командного рядка).
+    # Загальний прохід без блокувань лише знаходить кандидатів; кожен виправляється окремо
+    actual = _count_items(conn)
+    stored = {row.owner_id: row for row in conn.execute(select(CatalogStatsDB.owner_id, *(getattr(CatalogStatsDB, column) for column in COUNT_COLUMNS)))}
+    drifted = [
+        owner_id for owner_id, row in stored.items()
+        if any(getattr(row, column) != value for column, value in actual.get(owner_id, dict.fromkeys(COUNT_COLUMNS, 0)).items())
+    ]
+    # Записи є, а рядка статистики ще немає
+    drifted += [owner_id for owner_id in actual if owner_id not in stored]
+    for owner_id in drifted:
+        _repair_owner(conn, owner_id)
+    return len(drifted)
+
+
+async def reconcile_periodically(bind, interval: float = STATS_RECONCILE_INTERVAL):
+    # Фонове завдання додатку: звірка раз на interval секунд у потоці, щоб не блокувати event loop
+    def reconcile():
+        with bind.begin() as conn:
+            return reconcile_catalog_stats(conn)
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            repaired = await asyncio.to_thread(reconcile)
+            if repaired:
+                print(f"🧮 Лічильники каталогу виправлено для {repaired} користувачів")
+        except Exception as e:
+            print(f"❌ Помилка звірки лічильників: {e}")
+
+
+if __name__ == "__main__":
+    from database import engine
+    with engine.begin() as conn:
+        print(f"🧮 Звірку завершено, виправлено рядків: {reconcile_catalog_stats(conn)}")
@@ -0,0 +1,337 @@
+import os
+import hmac
+import time
+import uuid
+import socket
+import shutil
+import asyncio
+import hashlib
+import ipaddress
+from functools import lru_cache
+from collections import OrderedDict
+from urllib.parse import urlsplit, urljoin, quote
+import httpx
+from PIL import Image, ImageOps
+from uploads import run_image_job
+
+# Обкладинки: image_url записів — це хотлінки на сторонні сайти, часто повнорозмірні.
+# Фоновий воркер завантажує кожен URL один раз, робить кілька WebP-мініатюр і кладе їх
+# у дисковий LRU-кеш з обмеженням розміру; сторінки посилаються на /covers/..., а не на оригінал.
+COVER_CACHE_DIR = os.getenv("COVER_CACHE_DIR", "cache/covers")
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Розміри — найбільша сторона в пікселях; "sm" покриває мініатюри списків на екранах з DPR 2
+COVER_SIZES = {
+    name: int(edge)
+    for name, edge in (pair.split(":") for pair in os.getenv("COVER_SIZES", "sm:160,md:480").split(","))
+}
+COVER_QUALITY = int(os.getenv("COVER_QUALITY", "80"))
+COVER_WORKERS = int(os.getenv("COVER_WORKERS", "2"))
+COVER_QUEUE_SIZE = int(os.getenv("COVER_QUEUE_SIZE", "1000"))
+COVER_FETCH_TIMEOUT = float(os.getenv("COVER_FETCH_TIMEOUT", "10"))
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", str(10 * 1024 * 1024)))
+COVER_MAX_PIXELS = int(os.getenv("COVER_MAX_PIXELS", str(40_000_000)))
+COVER_MAX_REDIRECTS = int(os.getenv("COVER_MAX_REDIRECTS", "3"))
+# Скільки запит обкладинки чекає на воркер, перш ніж віддати редірект на оригінал
+COVER_WAIT_TIMEOUT = float(os.getenv("COVER_WAIT_TIMEOUT", "3"))
+# Невдалий URL не смикаємо повторно на кожен перегляд сторінки
+COVER_RETRY_AFTER = float(os.getenv("COVER_RETRY_AFTER", "3600"))
+# Приватні та loopback-адреси заборонені (SSRF); 1 — дозволити, напр. для локального стенда
+COVER_ALLOW_PRIVATE = os.getenv("COVER_ALLOW_PRIVATE", "0") == "1"
+COVER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# mtime каталогу запису оновлюється не частіше — так порядок LRU переживає перезапуск
+COVER_TOUCH_INTERVAL = 600
+# Каталог спільний для всіх воркерів: після додавання запису індекс перечитується з диска
+# не частіше ніж раз на стільки секунд, і ліміт розміру діє на каталог, а не на процес
+COVER_RESCAN_INTERVAL = float(os.getenv("COVER_RESCAN_INTERVAL", "60"))
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+
+
+class CoverRejected(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def cover_key(url: str):
+    # Підписаний ключ: /covers/ не можна використати як проксі для довільних URL
+    return hmac.new(SECRET_KEY.encode(), url.encode(), hashlib.sha256).hexdigest()[:32]
+
+def is_signed(key: str, url: str):
+    return bool(url) and hmac.compare_digest(key, cover_key(url))
+
+def is_remote(url: str):
+    return bool(url) and url.startswith(("http://", "https://"))
+
+def cover_url(image_url: str, size: str = "sm"):
+    # Глобальна функція шаблонів; локальні та data:-адреси лишаються як є
+    if not is_remote(image_url) or COVER_CACHE_MAX_BYTES <= 0:
+        return image_url
+    return f"/covers/{size}/{cover_key(image_url)}.webp?u={quote(image_url, safe='')}"
+
+
+def make_cover_thumbnails(source_path: str, target_dir: str, sizes: dict, quality: int = COVER_QUALITY):
+    # Виконується в пулі процесів: декодування та ресайз — чистий CPU
+    with Image.open(source_path) as image:
+        if image.width * image.height > COVER_MAX_PIXELS:
+            raise CoverRejected(f"Зображення завелике: {image.width}×{image.height}")
+        # JPEG можна декодувати одразу зменшеним — у рази швидше для фото з камер
+        image.draft("RGB", (max(sizes.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        os.makedirs(target_dir, exist_ok=True)
+        total = 0
+        for name, edge in sizes.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((edge, edge), Image.LANCZOS)
+            target_path = os.path.join(target_dir, f"{name}.webp")
+            partial_path = f"{target_path}.{uuid.uuid4().hex[:8]}.part"
+            thumbnail.save(partial_path, "WEBP", quality=quality, method=4)
+            os.replace(partial_path, target_path)
+            total += os.path.getsize(target_path)
+    return total
+
+
+class CoverCache:
+    # Дисковий LRU: кожен URL — каталог {key}/ з файлами розмірів. Індекс у пам'яті
+    # відновлюється скануванням при старті й періодично після додавань (порядок — за mtime
+    # каталогів), тож бачить і записи інших воркерів, що ділять той самий каталог.
+    def __init__(self, directory: str = COVER_CACHE_DIR, max_bytes: int = COVER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> [байти, час останнього touch]
+        self.total_bytes = 0
+        self.scanned_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_dir(self, key: str):
+        return os.path.join(self.directory, key)
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".fetch_"):
+                os.remove(entry.path)  # обірване завантаження з попереднього запуску
+        self.apply(self.scan(), time.time())
+
+    def scan(self):
+        # Лише читає диск — можна виконувати в потоці: [(mtime, key, байти)]
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and not entry.name.startswith("."):
+                try:
+                    size = sum(file.stat().st_size for file in os.scandir(entry.path) if file.is_file())
+                    found.append((entry.stat().st_mtime, entry.name, size))
+                except FileNotFoundError:
+                    pass  # інший воркер саме витіснив цей запис
+        return found
+
+    def apply(self, found, started: float):
+        # Записи, додані цим процесом під час сканування, не губимо
+        recent = {key: entry for key, entry in self.entries.items() if entry[1] >= started}
+        self.entries.clear()
+        self.total_bytes = 0
+        for mtime, key, size in sorted(found):
+            self.entries[key] = [size, mtime]
+            self.total_bytes += size
+        for key, entry in recent.items():
+            if key not in self.entries:
+                self.entries[key] = entry
+                self.total_bytes += entry[0]
+        self.scanned_at = time.monotonic()
+        self.evict()
+
+    def needs_rescan(self):
+        return time.monotonic() - self.scanned_at > COVER_RESCAN_INTERVAL
+
+    def lookup(self, key: str, size: str):
+        entry = self.entries.get(key)
+        path = os.path.join(self.key_dir(key), f"{size}.webp")
+        if entry is None or not os.path.isfile(path):
+            # Файл міг прибрати інший воркер, що ділить той самий каталог
+            if entry is not None:
+                self.drop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        now = time.time()
+        if now - entry[1] > COVER_TOUCH_INTERVAL:
+            entry[1] = now
+            os.utime(self.key_dir(key))
+        self.hits += 1
+        return path
+
+    def add(self, key: str, size: int):
+        self.drop(key)
+        self.entries[key] = [size, time.time()]
+        self.total_bytes += size
+        self.evict()
+
+    def drop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry[0]
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, (size, _) = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            shutil.rmtree(self.key_dir(key), ignore_errors=True)
+            self.evictions += 1
+
+
+async def resolve(hostname: str, port: int):
+    infos = await asyncio.get_running_loop().getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    return [address[0] for *_, address in infos]
+
+async def check_public_url(url: str):
+    # Повертає IP, до якого й треба підключатись: якби httpx розв'язував ім'я ще раз,
+    # DNS міг би між перевіркою та з'єднанням відповісти приватною адресою (DNS rebinding)
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise CoverRejected(f"Непідтримувана адреса: {url[:100]}")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    addresses = await resolve(parts.hostname, port)
+    if not addresses:
+        raise CoverRejected(f"Адресу {parts.hostname} не знайдено")
+    if not COVER_ALLOW_PRIVATE:
+        for address in addresses:
+            if not ipaddress.ip_address(address.split("%")[0]).is_global:
+                raise CoverRejected(f"Адреса {parts.hostname} веде у приватну мережу")
+    return addresses[0]
+
+def pinned_request(url: str, address: str):
+    # Запит на перевірену IP-адресу: ім'я сервера — в Host і TLS SNI (за ним же перевіряється сертифікат)
+    original = httpx.URL(url)
+    extensions = {"sni_hostname": original.raw_host.decode("ascii")} if original.scheme == "https" else {}
+    return original.copy_with(host=address), {"Host": original.netloc.decode("ascii")}, extensions
+
+
+class CoverService:
+    # Черга завантажень з кількома воркерами. Однакові URL, запитані паралельно,
+    # завантажуються один раз: усі чекають на той самий Future.
+    def __init__(self, cache: CoverCache):
+        self.cache = cache
+        self.queue = asyncio.Queue(maxsize=COVER_QUEUE_SIZE)
+        self.pending = {}
+        self.failures = {}
+        self.tasks = []
+        self.client = None
+        self.fetched = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        self.client = httpx.AsyncClient(timeout=COVER_FETCH_TIMEOUT, headers={"User-Agent": "GlobiFy-covers/1.0"})
+        self.tasks = [asyncio.create_task(self.run()) for _ in range(COVER_WORKERS)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    def request(self, key: str, url: str):
+        # Future з результатом (True — мініатюри готові) або None, якщо URL нещодавно не вдався
+        future = self.pending.get(key)
+        if future:
+            return future
+        failed_at = self.failures.get(key)
+        if failed_at and time.monotonic() - failed_at < COVER_RETRY_AFTER:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((key, url))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return None
+        self.pending[key] = future
+        return future
+
+    def prefetch(self, image_url: str):
+        # Після збереження запису — щоб перший перегляд сторінки вже мав мініатюру
+        if is_remote(image_url) and cover_key(image_url) not in self.cache.entries:
+            self.request(cover_key(image_url), image_url)
+
+    async def wait(self, key: str, url: str):
+        future = self.request(key, url)
+        if future is None:
+            return False
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), COVER_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self):
+        while True:
+            key, url = await self.queue.get()
+            try:
+                await self.build(key, url)
+                self.failures.pop(key, None)
+                self.fetched += 1
+                ready = True
+            except Exception as e:
+                self.failures[key] = time.monotonic()
+                self.failed += 1
+                ready = False
+                print(f"❌ Обкладинку {url[:100]} не завантажено: {e}")
+            future = self.pending.pop(key, None)
+            if future and not future.done():
+                future.set_result(ready)
+            self.queue.task_done()
+
+    async def build(self, key: str, url: str):
+        temp_path = os.path.join(self.cache.directory, f".fetch_{uuid.uuid4().hex}")
+        try:
+            await self.download(url, temp_path)
+            size = await run_image_job(make_cover_thumbnails, temp_path, self.cache.key_dir(key), COVER_SIZES)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.cache.add(key, size)
+        if self.cache.needs_rescan():
+            started = time.time()
+            self.cache.apply(await asyncio.to_thread(self.cache.scan), started)
+
+    async def download(self, url: str, path: str):
+        # Редіректи обробляємо вручну: кожну наступну адресу теж перевіряємо на приватні мережі
+        for _ in range(COVER_MAX_REDIRECTS + 1):
+            target, headers, extensions = pinned_request(url, await check_public_url(url))
+            async with self.client.stream("GET", target, headers=headers, extensions=extensions) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                response.raise_for_status()
+                if int(response.headers.get("content-length") or 0) > COVER_MAX_BYTES:
+                    raise CoverRejected("Файл завеликий")
+                written = 0
+                with open(path, "wb") as buffer:
+                    async for chunk in response.aiter_bytes():
+                        written += len(chunk)
+                        if written > COVER_MAX_BYTES:
+                            raise CoverRejected("Файл завеликий")
+                        await asyncio.to_thread(buffer.write, chunk)
+                return
+        raise CoverRejected("Забагато редиректів")
+
+    def stats(self):
+        lookups = self.cache.hits + self.cache.misses
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "hit_ratio": self.cache.hits / lookups if lookups else 0.0,
+            "evictions": self.cache.evictions,
+            "entries": len(self.cache.entries),
+            "bytes": self.cache.total_bytes,
+            "fetched": self.fetched,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+        }
+
+
+cover_service = CoverService(CoverCache())
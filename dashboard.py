@@ -0,0 +1,115 @@
+import os
+import base64
+from sqlalchemy import select, union_all, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import UserDB, ItemDB, CATEGORIES
+from feed_cache import feed_cache
+from catalog_stats import load_catalog_stats, category_counts, shared_counts
+
+# Дані головної сторінки: лічильники, закріплені матеріали та перша сторінка
+# глобальної стрічки — кожне одним індексованим запитом до items на всі категорії.
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "10"))
+
+
+def _group_by_category(rows):
+    grouped = {category: [] for category in CATEGORIES}
+    for row in rows:
+        grouped[row.category].append(row)
+    return grouped
+
+
+# --- Курсор стрічки ---
+def encode_feed_cursor(item):
+    raw = f"{item.rating}:{item.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_feed_cursor(cursor: str):
+    try:
+        rating, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(rating), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# --- 📊 Статистика ---
+async def load_category_counts(db: AsyncSession, user_id: int):
+    # Лічильники ведуться в catalog_stats разом зі змінами — один пошук за первинним ключем
+    stats = await load_catalog_stats(db, user_id)
+    return category_counts(stats), shared_counts(stats)
+
+
+# --- 📌 Мої закріплені матеріали ---
+async def load_pinned(db: AsyncSession, user_id: int):
+    query = select(ItemDB).where(ItemDB.owner_id == user_id, ItemDB.is_shared == True).order_by(ItemDB.rating.desc())
+    return _group_by_category(await db.scalars(query))
+
+
+# --- 🌍 Глобальна стрічка ---
+def _feed_select(category: str, viewer_id: int = None, position=None, limit: int = FEED_PAGE_SIZE + 1):
+    query = (
+        select(ItemDB.category, ItemDB.id, ItemDB.title, ItemDB.author, ItemDB.rating, ItemDB.link, ItemDB.image_url, ItemDB.owner_id, UserDB.username)
+        .join(UserDB, ItemDB.owner_id == UserDB.id)
+        .where(ItemDB.category == category, ItemDB.is_shared == True)
+        # Старі рядки без оцінки не мають місця в порядку (rating, id) і ламали б курсор
+        .where(ItemDB.rating.isnot(None))
+    )
+    if viewer_id is not None:
+        query = query.where(ItemDB.owner_id != viewer_id)
+    if position:
+        # Keyset-пагінація: (rating, id) строго менше за останній показаний запис, без OFFSET
+        rating, item_id = position
+        query = query.where(or_(ItemDB.rating < rating, and_(ItemDB.rating == rating, ItemDB.id < item_id)))
+    # За замовчуванням зайвий рядок лише підказує, що є наступна сторінка
+    return query.order_by(ItemDB.rating.desc(), ItemDB.id.desc()).limit(limit)
+
+def _split_page(rows):
+    next_cursor = encode_feed_cursor(rows[FEED_PAGE_SIZE - 1]) if len(rows) > FEED_PAGE_SIZE else None
+    return rows[:FEED_PAGE_SIZE], next_cursor
+
+async def _union_by_category(db: AsyncSession, selects):
+    # Кожна гілка UNION обмежена власним LIMIT, тому загорнута в підзапит
+    rows = (await db.execute(union_all(*(select(query.subquery()) for query in selects)))).all()
+    # UNION не гарантує порядок рядків між гілками — сортуємо кожну категорію тут
+    rows.sort(key=lambda row: (row.rating, row.id), reverse=True)
+    return _group_by_category(rows)
+
+async def refresh_feed_cache(db: AsyncSession, categories):
+    # Один запит на всі застарілі категорії: топ FEED_CACHE_DEPTH (+1 як ознака неповноти)
+    stale = [category for category in categories if feed_cache.needs_rebuild(category)]
+    if not stale:
+        return
+    grouped = await _union_by_category(db, [_feed_select(category, limit=feed_cache.depth + 1) for category in stale])
+    for category in stale:
+        feed_cache.store(category, grouped[category])
+
+async def load_feed_page(db: AsyncSession, category: str, viewer_id: int, cursor: str = None):
+    position = decode_feed_cursor(cursor) if cursor else None
+    if cursor and position is None:
+        return [], None
+    await refresh_feed_cache(db, [category])
+    rows = feed_cache.page(category, viewer_id, position, FEED_PAGE_SIZE + 1)
+    if rows is None:
+        rows = (await db.execute(_feed_select(category, viewer_id, position))).all()
+    return _split_page(rows)
+
+async def load_feed_first_pages(db: AsyncSession, viewer_id: int):
+    await refresh_feed_cache(db, CATEGORIES)
+    pages = {category: feed_cache.page(category, viewer_id, None, FEED_PAGE_SIZE + 1) for category in CATEGORIES}
+    # Те, на що кеш не відповів (вимкнений або глядач "з'їв" неповну верхівку), — одним запитом з БД
+    missing = [category for category, rows in pages.items() if rows is None]
+    if missing:
+        grouped = await _union_by_category(db, [_feed_select(category, viewer_id) for category in missing])
+        pages.update((category, grouped[category]) for category in missing)
+    return {category: _split_page(rows) for category, rows in pages.items()}
+
+
+async def load_dashboard(db: AsyncSession, user_id: int):
+    counts, shared = await load_category_counts(db, user_id)
+    # Без жодного поширеного запису закріплених немає — запит не потрібен
+    pinned = await load_pinned(db, user_id) if any(shared.values()) else _group_by_category([])
+    return {
+        "counts": counts,
+        "shared": shared,
+        "pinned": pinned,
+        "feed": await load_feed_first_pages(db, user_id),
+    }
@@ -0,0 +1,152 @@
+import os
+import time
+import itertools
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from dotenv import load_dotenv
+
+# .env читається лише тут — це єдиний модуль, якому налаштування потрібні ще до створення рушіїв.
+# На сервері змінні краще передавати напряму (uvicorn --env-file .env або оточення контейнера).
+load_dotenv()
+
+# Налаштування Бази Даних
+SQLALCHEMY_DATABASE_URL = os.getenv("DB_URL")
+
+# Пул з'єднань: розмір, запас понад розмір, очікування вільного з'єднання, перевірка
+# з'єднання перед видачею (pre_ping) та примусове перевідкриття старих (recycle, секунди)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Фонові воркери в потоках (пошта, звірка, міграції) — їм вистачає малого пулу
+DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+
+# Репліки для читання (URL через кому). Порожньо — усі запити йдуть на основну БД
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# Стільки секунд після власного запису користувач читає з основної БД: репліки можуть відставати
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+
+# Асинхронні драйвери для маршрутів: asyncpg для Postgres, aiosqlite для локальної SQLite
+ASYNC_DRIVERS = {"postgres": "postgresql+asyncpg", "postgresql": "postgresql+asyncpg", "postgresql+psycopg2": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def to_async_url(database_url: str):
+    url = make_url(database_url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    # asyncpg не знає libpq-параметр sslmode (його додають Render/Heroku) — лише ssl
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+
+def to_sync_url(database_url: str):
+    url = make_url(database_url)
+    # Postgres-URL виду postgres:// SQLAlchemy вже не приймає
+    if url.drivername == "postgres":
+        url = url.set(drivername="postgresql")
+    return url
+
+
+def pool_options(url, pool_size: int = DB_POOL_SIZE):
+    # SQLite у пам'яті живе в одному з'єднанні (StaticPool) — параметри пулу там не застосовні
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Рушії лише описують підключення: з'єднання відкриваються при першому запиті
+# або під час прогріву в lifespan (main.py), тож імпорт не звертається до БД.
+# Синхронний рушій лишається для міграцій і фонових воркерів, що працюють у потоках
+sync_url = to_sync_url(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(sync_url, **pool_options(sync_url, DB_SYNC_POOL_SIZE))
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Маршрути FastAPI працюють через асинхронний рушій і не блокують event loop
+async_url = to_async_url(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(async_url, **pool_options(async_url))
+
+replica_engines = [create_async_engine(url, **pool_options(url)) for url in map(to_async_url, DB_REPLICA_URLS)]
+_replica_turn = itertools.count()
+
+
+class RoutingSession(Session):
+    # Сесії з info["replica"] читають з реплік по колу (одна репліка на сесію, щоб не змішувати
+    # різне відставання). Flush, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE і сирий SQL
+    # ідуть на основну БД — як і всі наступні запити цієї сесії.
+    def get_bind(self, mapper=None, clause=None, **kw):
+        is_read = clause is not None and clause.is_select and getattr(clause, "_for_update_arg", None) is None
+        if self._flushing or (clause is not None and clause.is_dml):
+            self.info["wrote"] = True
+        if not is_read or not self.info.get("replica") or self.info.get("wrote"):
+            return async_engine.sync_engine
+        replica = self.info.get("replica_engine")
+        if replica is None:
+            replica = self.info["replica_engine"] = replica_engines[next(_replica_turn) % len(replica_engines)]
+        return replica.sync_engine
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_write(session):
+    # Read-your-writes: час запису кладемо в підписану cookie-сесію, щоб наступні GET
+    # цього користувача (у будь-якому воркері) DB_REPLICA_STICKY_SECONDS читали з основної БД
+    request = session.info.get("request")
+    if replica_engines and request is not None and session.info.get("wrote"):
+        request.session["db_write_at"] = time.time()
+
+
+AsyncSessionLocal = async_sessionmaker(async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+async def warm_pool(count: int = DB_POOL_SIZE):
+    # Відкриває count з'єднань одночасно й повертає їх у пул: перші запити не платять за підключення
+    connections = []
+    try:
+        for _ in range(count):
+            connection = await async_engine.connect()
+            connections.append(connection)
+            await connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            await connection.close()
+    return len(connections)
+
+
+async def ping():
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+def reads_from_replica(request: Request):
+    # На репліки — лише GET/HEAD і лише якщо користувач нещодавно нічого не записував
+    if not replica_engines or request.method not in ("GET", "HEAD"):
+        return False
+    last_write = request.session.get("db_write_at", 0) if "session" in request.scope else 0
+    return time.time() - last_write > DB_REPLICA_STICKY_SECONDS
+
+
+def use_primary(db):
+    # Решта читань цієї сесії — з основної БД: потрібного рядка ще може не бути на репліці
+    db.sync_session.info["replica"] = False
+
+
+async def get_db(request: Request):
+    async with AsyncSessionLocal(info={"replica": reads_from_replica(request), "request": request}) as db:
+        yield db
+
+
+async def get_primary_db(request: Request):
+    # Для GET-маршрутів, що читають щойно записане кимось іншим (підтвердження пошти)
+    async with AsyncSessionLocal(info={"request": request}) as db:
+        yield db
@@ -0,0 +1,149 @@
+import os
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+
+# Спільний для всіх глядачів кеш глобальної стрічки: по кожній категорії тримаємо
+# топ FEED_CACHE_DEPTH поширених записів у порядку (rating, id) DESC. Власні записи
+# глядача відфільтровуються при читанні. Зміни (share/edit/delete) оновлюють кеш одразу,
+# а FEED_CACHE_TTL обмежує застарілість щодо змін з інших процесів.
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+FEED_CACHE_DEPTH = int(os.getenv("FEED_CACHE_DEPTH", "200"))
+
+
+@dataclass(frozen=True)
+class FeedEntry:
+    category: str
+    id: int
+    title: str
+    author: str
+    rating: float
+    link: str
+    image_url: str
+    owner_id: int
+    username: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.category, row.id, row.title, row.author, row.rating, row.link, row.image_url, row.owner_id, row.username)
+
+    @classmethod
+    def from_item(cls, category: str, item, username: str):
+        return cls(category, item.id, item.title, item.author, item.rating, item.link, item.image_url, item.owner_id, username)
+
+    @property
+    def sort_key(self):
+        return (-self.rating, -self.id)
+
+
+class CategoryFeed:
+    def __init__(self, entries, complete: bool):
+        # entries відсортовані за sort_key, тобто (rating, id) за спаданням
+        self.entries = sorted(entries, key=lambda entry: entry.sort_key)
+        self.keys = [entry.sort_key for entry in self.entries]
+        # complete = у кеші всі поширені записи категорії, а не лише верхівка
+        self.complete = complete
+        self.built_at = time.monotonic()
+
+    def remove(self, item_id: int):
+        for index, entry in enumerate(self.entries):
+            if entry.id == item_id:
+                del self.entries[index]
+                del self.keys[index]
+                return
+
+    def insert(self, entry: FeedEntry):
+        # Запис нижче за межу неповного кешу туди не потрапляє — його віддасть БД
+        if not self.complete and (not self.keys or entry.sort_key > self.keys[-1]):
+            return
+        index = bisect_right(self.keys, entry.sort_key)
+        self.keys.insert(index, entry.sort_key)
+        self.entries.insert(index, entry)
+
+
+class FeedCache:
+    def __init__(self, ttl: float = FEED_CACHE_TTL, depth: int = FEED_CACHE_DEPTH):
+        self.ttl = ttl
+        self.depth = depth
+        self.categories = {}
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.depth > 0
+
+    def needs_rebuild(self, category: str):
+        feed = self.categories.get(category)
+        return self.enabled and (feed is None or time.monotonic() - feed.built_at > self.ttl)
+
+    def store(self, category: str, rows):
+        # rows — топ self.depth + 1 записів із БД; зайвий лише показує, що кеш неповний
+        entries = [FeedEntry.from_row(row) for row in rows[:self.depth]]
+        self.categories[category] = CategoryFeed(entries, complete=len(rows) <= self.depth)
+        self.rebuilds += 1
+
+    def page(self, category: str, viewer_id: int, position, size: int):
+        # Повертає до size записів після position або None, якщо кеш не може відповісти
+        feed = self.categories.get(category)
+        if feed is None or self.needs_rebuild(category):
+            self.misses += 1
+            return None
+        start = bisect_right(feed.keys, (-position[0], -position[1])) if position else 0
+        items = []
+        for entry in feed.entries[start:]:
+            if entry.owner_id == viewer_id:
+                continue
+            items.append(entry)
+            if len(items) == size:
+                break
+        if len(items) < size and not feed.complete:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return items
+
+    def upsert(self, entry: FeedEntry):
+        feed = self.categories.get(entry.category)
+        if feed:
+            feed.remove(entry.id)
+            feed.insert(entry)
+            self.invalidations += 1
+
+    def sync(self, category: str, item, username: str):
+        # Викликається після commit зміни запису: поширений — оновити, ні — прибрати.
+        # Записи без оцінки до стрічки не потрапляють (див. _feed_select)
+        if item.is_shared and item.rating is not None:
+            self.upsert(FeedEntry.from_item(category, item, username))
+        else:
+            self.remove(category, item.id)
+
+    def remove(self, category: str, item_id: int):
+        feed = self.categories.get(category)
+        if feed:
+            feed.remove(item_id)
+            self.invalidations += 1
+
+    def invalidate(self, category: str):
+        # Масові зміни (імпорт) простіше не вливати по одному, а перебудувати категорію
+        if self.categories.pop(category, None):
+            self.invalidations += 1
+
+    def clear(self):
+        self.categories.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "rebuilds": self.rebuilds,
+            "invalidations": self.invalidations,
+            "entries": {category: len(feed.entries) for category, feed in self.categories.items()},
+        }
+
+
+feed_cache = FeedCache()
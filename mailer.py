@@ -0,0 +1,245 @@
+import os
+import time
+import socket
+import asyncio
+import smtplib
+from datetime import datetime, timedelta, timezone
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import OutboxEmailDB
+
+# Налаштування Пошти
+SENDER_EMAIL = os.getenv("EMAIL_SENDER")
+SENDER_PASSWORD = os.getenv("EMAIL_PASSWORD")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "15"))
+# Після стількох секунд простою з'єднання закривається, а не тримається вічно
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+APP_BASE_URL = os.getenv("APP_BASE_URL", "https://globify-site.onrender.com")
+
+# Налаштування черги
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "5"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "30"))
+MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX", "3600"))
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def build_verification_email(token: str):
+    subject = "Підтвердження реєстрації на GlobiFy 🚀"
+    verification_link = f"{APP_BASE_URL}/verify/{token}"
+    
+    html_content = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; text-align: center; padding: 30px; background-color: #f8f9fa;">
+            <div style="max-width: 500px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
+                <h2 style="color: #333;">Вітаємо у GlobiFy! 🎉</h2>
+                <p style="color: #555; font-size: 16px;">Дякуємо за реєстрацію. Щоб активувати ваш акаунт, натисніть на кнопку нижче:</p>
+                <a href="{verification_link}" style="display: inline-block; padding: 12px 25px; color: white; background-color: #ffc107; text-decoration: none; border-radius: 50px; font-weight: bold; margin-top: 20px; font-size: 16px;">Підтвердити пошту</a>
+            </div>
+        </body>
+    </html>
+    """
+    return subject, html_content
+
+
+def enqueue_email(db: Session, recipient: str, subject: str, html: str):
+    # Комміт робить викликач — разом з рештою змін запиту
+    now = utcnow()
+    db.add(OutboxEmailDB(recipient=recipient, subject=subject, html=html, status="pending", attempts=0, next_attempt_at=now, created_at=now))
+
+
+# Відмови щодо конкретного листа. Решта помилок (з'єднання, TLS, вхід з невірним
+# EMAIL_PASSWORD) — проблема сервера чи налаштувань, а не листа: такі повторюємо
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def is_permanent_failure(error: Exception):
+    # Відмова з кодом 5xx (немає такої скриньки тощо) повтором не виправиться
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, MESSAGE_ERRORS) and 500 <= error.smtp_code < 600
+
+
+def retry_delay(attempts: int):
+    # Експоненційна затримка: 30с, 1хв, 2хв, 4хв ... але не більше MAIL_RETRY_MAX
+    return min(MAIL_RETRY_BASE * 2 ** (attempts - 1), MAIL_RETRY_MAX)
+
+
+class ReusableSMTP:
+    # Одне SMTP-з'єднання на воркер: відкривається за потреби, перевіряється NOOP-ом
+    # і перевикористовується для всіх листів, доки не простоїть SMTP_IDLE_TIMEOUT
+    def __init__(self):
+        self.server = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
+            server.starttls()  # Обов'язково для порту 587! Шифрує з'єднання.
+        if SENDER_PASSWORD:
+            server.login(SENDER_EMAIL, SENDER_PASSWORD)
+        return server
+
+    def _alive(self):
+        try:
+            return self.server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def get(self):
+        if self.server and (time.monotonic() - self.last_used > SMTP_IDLE_TIMEOUT or not self._alive()):
+            self.close()
+        if not self.server:
+            self.server = self._connect()
+        self.last_used = time.monotonic()
+        return self.server
+
+    def close(self):
+        if self.server:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def send(self, recipient: str, subject: str, html: str):
+        msg = MIMEMultipart()
+        msg["From"] = f"GlobiFy <{SENDER_EMAIL}>"
+        msg["To"] = recipient
+        msg["Subject"] = subject
+        msg.attach(MIMEText(html, "html"))
+        try:
+            self.get().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+            # Розірване з'єднання не рахуємо невдачею листа: одна спроба з новим.
+            # Відповіді сервера (SMTPException — теж OSError) сюди не потрапляють
+            self.close()
+            self.get().send_message(msg)
+
+
+class MailWorker:
+    # Фоновий воркер черги email_outbox. Увесь блокуючий SMTP і БД-код
+    # виконується в окремому потоці, тож event loop не чекає на поштовий сервер.
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.smtp = ReusableSMTP()
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+        # Скільки пачок підряд зупинилось через недоступний сервер — для затримки між ними
+        self.server_down = 0
+
+    def notify(self):
+        # Розбудити воркер одразу після постановки листа в чергу
+        self.wakeup.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self.smtp.close)
+
+    async def run(self):
+        while True:
+            try:
+                processed = await asyncio.to_thread(self.process_batch)
+            except Exception as e:
+                print(f"❌ Помилка воркера пошти: {e}")
+                processed = 0
+            if self.server_down:
+                # Сервер не приймає з'єднання чи вхід — нові листи його не полагодять
+                await asyncio.sleep(retry_delay(self.server_down))
+                continue
+            if processed >= MAIL_BATCH_SIZE:
+                continue  # У черзі, ймовірно, є ще листи — не чекаємо
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=MAIL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def process_batch(self):
+        db = self.session_factory()
+        try:
+            # SKIP LOCKED (Postgres) не дає кільком процесам надіслати той самий лист
+            batch = (
+                db.query(OutboxEmailDB)
+                .filter(OutboxEmailDB.status == "pending", OutboxEmailDB.next_attempt_at <= utcnow())
+                .order_by(OutboxEmailDB.next_attempt_at)
+                .limit(MAIL_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for email in batch:
+                if not self._deliver(email):
+                    break  # Решта пачки лишається в черзі як була
+            db.commit()
+            if not batch:
+                # Нема роботи — не тримаємо з'єднання з поштовим сервером довше, ніж треба
+                if self.smtp.server and time.monotonic() - self.smtp.last_used > SMTP_IDLE_TIMEOUT:
+                    self.smtp.close()
+            return len(batch)
+        finally:
+            db.close()
+
+    def _deliver(self, email: OutboxEmailDB):
+        # False — недоступний сам сервер: спроба листу не рахується, пачку треба зупинити
+        try:
+            self.smtp.send(email.recipient, email.subject, email.html)
+        except MESSAGE_ERRORS as e:
+            self._fail(email, e)
+        except OSError as e:
+            # З'єднання, TLS, SMTPAuthenticationError тощо (SMTPException — теж OSError)
+            self.smtp.close()
+            self.server_down += 1
+            email.last_error = str(e)[:500]
+            print(f"❌ Поштовий сервер недоступний, розсилку призупинено: {e}")
+            return False
+        except Exception as e:
+            self._fail(email, e)
+        else:
+            email.attempts += 1
+            email.status = "sent"
+            email.sent_at = utcnow()
+            self.sent += 1
+            print(f"✅ УРА! Лист успішно відправлено на {email.recipient}")
+        self.server_down = 0
+        return True
+
+    def _fail(self, email: OutboxEmailDB, error: Exception):
+        email.attempts += 1
+        permanent = is_permanent_failure(error)
+        if not permanent:
+            # Після відмови з кодом smtplib сам робить RSET — таке з'єднання ще придатне
+            self.smtp.close()
+        email.last_error = str(error)[:500]
+        if permanent or email.attempts >= MAIL_MAX_ATTEMPTS:
+            email.status = "dead"
+            self.dead += 1
+            print(f"💀 Лист на {email.recipient} не надіслано після {email.attempts} спроб: {error}")
+        else:
+            email.next_attempt_at = utcnow() + timedelta(seconds=retry_delay(email.attempts))
+            self.failed += 1
+            print(f"❌ Помилка відправки листа на {email.recipient} (спроба {email.attempts}): {error}")
+
+
+mail_worker = MailWorker()
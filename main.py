@@ -1,215 +1,250 @@
 import os
-import shutil
+import math
 import uuid
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from fastapi import FastAPI, Request, Depends, Form, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse
+import asyncio
+from functools import partial
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Request, Depends, Form, UploadFile, File, HTTPException, Response
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse, FileResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
-from passlib.context import CryptContext
+from sqlalchemy import select, func, update, delete, not_
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.sessions import SessionMiddleware
-from dotenv import load_dotenv
-
-# 1. Завантажуємо секретний сейф
-load_dotenv()
+from database import engine, async_engine, replica_engines, get_db, get_primary_db, use_primary, warm_pool, ping
+from models import UserDB, ItemDB, CATEGORIES
+from migrations import init_schema
+from dashboard import load_dashboard, load_feed_page, decode_feed_cursor
+from feed_cache import feed_cache
+from mailer import mail_worker, enqueue_email, build_verification_email
+from passwords import password_hasher, PasswordHasherBusy
+from ratelimit import rate_limiter, RateLimited, client_ip
+from user_cache import user_cache, remember_user
+from search import search_condition, search_items
+from static_assets import HashedStaticFiles
+from observability import MetricsMiddleware, metrics, instrument_engine, stats_collector, pool_collector
+from catalog_stats import bump_catalog_version, load_catalog_stats, item_deltas, category_counts, shared_counts, reconcile_periodically, STATS_RECONCILE_INTERVAL
+from catalog_api import item_to_dict, API_PAGE_SIZE, API_MAX_PAGE_SIZE, parse_fields, catalog_validators, is_not_modified, load_items_page, load_item
+from bulk import detect_format, import_items, export_items
+from covers import cover_service, cover_url, is_signed, COVER_SIZES, COVER_CACHE_CONTROL
+from uploads import UPLOAD_DIR, AvatarRejected, limited_form_request, save_avatar, remove_avatar_if_unused, shutdown_executor, sweep_periodically, AVATAR_SWEEP_INTERVAL
+
+# 1. Налаштування запуску
+# Схему (create_all + міграції) можна накочувати окремим кроком деплою: python migrations.py
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "1") == "1"
+# Скільки lifespan чекає на БД перед тим, як почати приймати з'єднання (далі — у фоні)
+STARTUP_TIMEOUT = float(os.getenv("STARTUP_TIMEOUT", "30"))
+STARTUP_RETRY_MAX = float(os.getenv("STARTUP_RETRY_MAX", "30"))
+READY_PING_TIMEOUT = float(os.getenv("READY_PING_TIMEOUT", "2"))
 
 # 2. Налаштування додатку
-app = FastAPI()
+async def prepare_database():
+    # Схема та прогрів пулу з повторами: тимчасово недоступна БД не валить процес,
+    # а лише тримає /readyz у стані 503, доки підключення не вдасться
+    delay = 1.0
+    while True:
+        try:
+            if DB_MIGRATE_ON_STARTUP:
+                await asyncio.to_thread(init_schema, engine)
+            warmed = await warm_pool()
+            print(f"✅ База готова, прогріто з'єднань: {warmed}")
+            app.state.ready = True
+            return
+        except Exception as e:
+            print(f"⏳ База недоступна ({e}), повтор через {delay:g} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STARTUP_RETRY_MAX)
+
+def warm_templates():
+    # Компілюємо всі шаблони заздалегідь — Jinja тримає їх у своєму кеші
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # Хеші та стиснені варіанти статики і скомпільовані шаблони — один раз, до першого запиту
+    await asyncio.to_thread(static_files.warm)
+    await asyncio.to_thread(warm_templates)
+    startup = asyncio.create_task(prepare_database())
+    try:
+        await asyncio.wait_for(asyncio.shield(startup), STARTUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("⚠️ База ще недоступна — сервер стартує, /readyz відповідає 503 до підключення")
+    # Фоновий воркер черги листів живе разом з процесом додатку
+    mail_worker.start()
+    # Воркер обкладинок: індекс дискового кешу відновлюється з файлів попереднього запуску
+    await asyncio.to_thread(cover_service.cache.load)
+    cover_service.start()
+    # Періодична звірка лічильників каталогу з items (0 — вимкнено)
+    reconciler = asyncio.create_task(reconcile_periodically(engine)) if STATS_RECONCILE_INTERVAL > 0 else None
+    # Старі аватарки, що пережили AVATAR_ORPHAN_MIN_AGE, прибираються тут же (0 — вимкнено)
+    avatar_sweeper = asyncio.create_task(sweep_periodically(engine)) if AVATAR_SWEEP_INTERVAL > 0 else None
+    yield
+    startup.cancel()
+    for task in (reconciler, avatar_sweeper):
+        if task:
+            task.cancel()
+    await mail_worker.stop()
+    await cover_service.stop()
+    await rate_limiter.close()
+    password_hasher.shutdown()
+    shutdown_executor()
+    await async_engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY"))
-
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Додається останнім, тож стоїть зовні: рахує повний час запиту разом із сесією
+app.add_middleware(MetricsMiddleware)
+
+# Метрики SQL для всіх рушіїв (маршрути — async і репліки, міграції та воркер пошти — sync)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+for replica in replica_engines:
+    instrument_engine(replica.sync_engine)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+static_files = HashedStaticFiles(directory="static")
+app.mount("/static", static_files, name="static")
 templates = Jinja2Templates(directory="templates")
-
-UPLOAD_DIR = "static/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-# 3. Налаштування Бази Даних
-SQLALCHEMY_DATABASE_URL = os.getenv("DB_URL")
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# 4. Налаштування Пошти
-SENDER_EMAIL = os.getenv("EMAIL_SENDER")
-SENDER_PASSWORD = os.getenv("EMAIL_PASSWORD")
-
-def send_verification_email(receiver_email: str, token: str):
-    subject = "Підтвердження реєстрації на GlobiFy 🚀"
-    verification_link = f"https://globify-site.onrender.com/verify/{token}"
-    
-    html_content = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; text-align: center; padding: 30px; background-color: #f8f9fa;">
-            <div style="max-width: 500px; margin: 0 auto; background: white; padding: 20px; border-radius: 10px; box-shadow: 0 4px 8px rgba(0,0,0,0.1);">
-                <h2 style="color: #333;">Вітаємо у GlobiFy! 🎉</h2>
-                <p style="color: #555; font-size: 16px;">Дякуємо за реєстрацію. Щоб активувати ваш акаунт, натисніть на кнопку нижче:</p>
-                <a href="{verification_link}" style="display: inline-block; padding: 12px 25px; color: white; background-color: #ffc107; text-decoration: none; border-radius: 50px; font-weight: bold; margin-top: 20px; font-size: 16px;">Підтвердити пошту</a>
-            </div>
-        </body>
-    </html>
-    """
-    
-    msg = MIMEMultipart()
-    msg["From"] = f"GlobiFy <{SENDER_EMAIL}>"
-    msg["To"] = receiver_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(html_content, "html"))
-    
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()  # Цей рядок обов'язковий для порту 587! Він шифрує з'єднання.
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.send_message(msg)
-            print(f"✅ УРА! Лист успішно відправлено на {receiver_email}")
-    except Exception as e:
-        print(f"❌ Помилка відправки листа: {e}")
-        # Хакерське посилання для логів:
-        print(f"🔥 ХАКЕРСЬКЕ ПОСИЛАННЯ ДЛЯ ПІДТВЕРДЖЕННЯ: {verification_link}")
-
-# Хешування паролів
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# --- 2. МОДЕЛІ ДАНИХ ---
-class UserDB(Base):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    email = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    is_verified = Column(Boolean, default=False)
-    verify_token = Column(String)
-    avatar_url = Column(String, default="")
-    bio = Column(String, default="")
-
-class FilmDB(Base):
-    __tablename__ = "films"
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    author = Column(String)
-    rating = Column(Float)
-    link = Column(String)
-    owner_id = Column(Integer)
-    is_shared = Column(Boolean, default=False)
-    image_url = Column(String, default="")
-
-class BookDB(Base):
-    __tablename__ = "books"
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    author = Column(String)
-    rating = Column(Float)
-    link = Column(String)
-    owner_id = Column(Integer)
-    is_shared = Column(Boolean, default=False)
-    image_url = Column(String, default="")
-
-class MusicDB(Base):
-    __tablename__ = "music"
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    author = Column(String)
-    rating = Column(Float)
-    link = Column(String)
-    owner_id = Column(Integer)
-    is_shared = Column(Boolean, default=False)
-    image_url = Column(String, default="")
-
-class VideoDB(Base):
-    __tablename__ = "videos"
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    author = Column(String)
-    rating = Column(Float)
-    link = Column(String)
-    owner_id = Column(Integer)
-    is_shared = Column(Boolean, default=False)
-    image_url = Column(String, default="")
-
-# Створюємо таблиці
-Base.metadata.create_all(bind=engine)
+templates.env.globals["static_url"] = static_files.url
+templates.env.globals["cover_url"] = cover_url
+
+metrics.register(pool_collector({
+    "async": async_engine.sync_engine.pool,
+    "sync": engine.pool,
+    **{f"replica{index}": replica.sync_engine.pool for index, replica in enumerate(replica_engines)},
+}))
+metrics.register(stats_collector("user_cache", "Кеш користувачів", user_cache.stats))
+metrics.register(stats_collector("feed_cache", "Кеш глобальної стрічки", feed_cache.stats))
+metrics.register(stats_collector("password_hasher", "Пул хешування паролів", password_hasher.stats))
+metrics.register(stats_collector("mail_worker", "Черга листів", lambda: {"sent": mail_worker.sent, "failed": mail_worker.failed, "dead": mail_worker.dead}))
+metrics.register(stats_collector("covers", "Кеш обкладинок", cover_service.stats))
+metrics.register(stats_collector("rate_limiter", "Обмеження частоти входу та реєстрації", rate_limiter.stats))
 
 # --- 4. ДОПОМІЖНІ ФУНКЦІЇ ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(request: Request, db: Session):
-    username = request.session.get("user")
-    if not username:
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return HTMLResponse("<h3>⏳ Сервер зараз перевантажений. Спробуйте ще раз за хвилину.</h3>", status_code=503, headers={"Retry-After": "5"})
+
+@app.exception_handler(RateLimited)
+async def rate_limited(request: Request, exc: RateLimited):
+    return HTMLResponse(f"<h3>⏳ Забагато спроб. Спробуйте ще раз через {exc.retry_after} с.</h3>", status_code=429, headers={"Retry-After": str(exc.retry_after)})
+
+async def get_current_user(request: Request, db: AsyncSession):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        # Сесії, створені до появи user_id, зберігали лише логін
+        username = request.session.get("user")
+        if not username:
+            return None
+        user = await db.scalar(select(UserDB).where(UserDB.username == username))
+        if not user:
+            return None
+        request.session["user_id"] = user.id
+        return remember_user(user)
+
+    cached_user = user_cache.get(user_id)
+    if cached_user:
+        return cached_user
+    user = await db.get(UserDB, user_id)
+    if not user and db.sync_session.info.get("replica"):
+        # Щойно зареєстрований користувач міг ще не дійти до репліки — це не привід розлогінювати
+        use_primary(db)
+        user = await db.get(UserDB, user_id)
+    if not user:
+        request.session.clear()
         return None
-    user = db.query(UserDB).filter(UserDB.username == username).first()
-    return user
+    return remember_user(user)
 
+# Для JSON API та часткових оновлень: замість редіректу на /login — 401
+async def require_api_user(request: Request, db: AsyncSession):
+    current_user = await get_current_user(request, db)
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Потрібна авторизація")
+    return current_user
 
 # --- 5. МАРШРУТИ ---
 
+# Перевірки для балансувальника: healthz — процес живий, readyz — прогрітий і бачить БД
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return JSONResponse({"status": "ok"})
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    try:
+        await asyncio.wait_for(ping(), READY_PING_TIMEOUT)
+    except Exception:
+        return JSONResponse({"status": "database unavailable"}, status_code=503)
+    return JSONResponse({"status": "ready"})
+
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def home(request: Request, db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     
     if not current_user:
         return templates.TemplateResponse("index.html", {"request": request, "user": None})
     
-    # 📊 Статистика
-    films_count = db.query(FilmDB).filter(FilmDB.owner_id == current_user.id).count()
-    books_count = db.query(BookDB).filter(BookDB.owner_id == current_user.id).count()
-    music_count = db.query(MusicDB).filter(MusicDB.owner_id == current_user.id).count()
-    videos_count = db.query(VideoDB).filter(VideoDB.owner_id == current_user.id).count()
-    
-    # 📌 1. МОЇ закріплені матеріали
-    my_films = db.query(FilmDB).filter(FilmDB.owner_id == current_user.id, FilmDB.is_shared == True).order_by(FilmDB.rating.desc()).all()
-    my_books = db.query(BookDB).filter(BookDB.owner_id == current_user.id, BookDB.is_shared == True).order_by(BookDB.rating.desc()).all()
-    my_music = db.query(MusicDB).filter(MusicDB.owner_id == current_user.id, MusicDB.is_shared == True).order_by(MusicDB.rating.desc()).all()
-    my_videos = db.query(VideoDB).filter(VideoDB.owner_id == current_user.id, VideoDB.is_shared == True).order_by(VideoDB.rating.desc()).all()
-
-    # 🌍 2. ГЛОБАЛЬНА СТРІЧКА
-    global_films = db.query(FilmDB, UserDB).join(UserDB, FilmDB.owner_id == UserDB.id).filter(FilmDB.is_shared == True, FilmDB.owner_id != current_user.id).order_by(FilmDB.rating.desc()).all()
-    global_books = db.query(BookDB, UserDB).join(UserDB, BookDB.owner_id == UserDB.id).filter(BookDB.is_shared == True, BookDB.owner_id != current_user.id).order_by(BookDB.rating.desc()).all()
-    global_music = db.query(MusicDB, UserDB).join(UserDB, MusicDB.owner_id == UserDB.id).filter(MusicDB.is_shared == True, MusicDB.owner_id != current_user.id).order_by(MusicDB.rating.desc()).all()
-    global_videos = db.query(VideoDB, UserDB).join(UserDB, VideoDB.owner_id == UserDB.id).filter(VideoDB.is_shared == True, VideoDB.owner_id != current_user.id).order_by(VideoDB.rating.desc()).all()
+    # 📊 Статистика — пошук за ключем у catalog_stats, 📌 мої закріплені та 🌍 перша сторінка стрічки — по запиту на всі категорії
+    dashboard = await load_dashboard(db, current_user.id)
+    counts, pinned, feed = dashboard["counts"], dashboard["pinned"], dashboard["feed"]
 
     return templates.TemplateResponse("index.html", {
         "request": request, 
         "user": current_user.username,
-        "films_count": films_count,
-        "books_count": books_count,
-        "music_count": music_count,
-        "videos_count": videos_count,
-        "my_films": my_films,
-        "my_books": my_books,
-        "my_music": my_music,
-        "my_videos": my_videos,
-        "global_films": global_films,
-        "global_books": global_books,
-        "global_music": global_music,
-        "global_videos": global_videos
+        "films_count": counts["films"],
+        "books_count": counts["books"],
+        "music_count": counts["music"],
+        "videos_count": counts["videos"],
+        "shared_counts": dashboard["shared"],
+        "my_films": pinned["films"],
+        "my_books": pinned["books"],
+        "my_music": pinned["music"],
+        "my_videos": pinned["videos"],
+        "global_films": feed["films"][0],
+        "global_books": feed["books"][0],
+        "global_music": feed["music"][0],
+        "global_videos": feed["videos"][0],
+        "feed_cursors": {category: page[1] for category, page in feed.items()}
     })
 
+@app.get("/feed/{category}", response_class=HTMLResponse)
+async def feed_page(category: str, request: Request, cursor: str = None, db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
+    if not current_user:
+        return HTMLResponse("", status_code=401)
+    if category not in CATEGORIES:
+        return HTMLResponse("", status_code=404)
+    items, next_cursor = await load_feed_page(db, category, current_user.id, cursor)
+    return templates.TemplateResponse("_feed_page.html", {"request": request, "items": items, "category": category, "next_cursor": next_cursor})
+
 # --- РЕЄСТРАЦІЯ ---
 @app.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
 
 @app.post("/register")
-async def register_user(username: str = Form(...), email: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    if db.query(UserDB).filter((UserDB.username == username) | (UserDB.email == email)).first():
+async def register_user(request: Request, username: str = Form(...), email: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    # Ліміт — до будь-якої роботи з БД, bcrypt і поштою
+    await rate_limiter.check("register", ip=client_ip(request), user=username.strip().lower())
+    if await db.scalar(select(UserDB).where((UserDB.username == username) | (UserDB.email == email))):
         return HTMLResponse("<h3>Користувач з таким логіном або поштою вже існує! <a href='/register'>Назад</a></h3>")
     
-    hashed_pass = pwd_context.hash(password)
+    hashed_pass = await password_hasher.hash(password)
     token = str(uuid.uuid4())
     
     new_user = UserDB(username=username, email=email, hashed_password=hashed_pass, is_verified=False, verify_token=token)
     db.add(new_user)
-    db.commit()
-
-    send_verification_email(email, token)
+    # Лист лише ставиться в чергу в тій самій транзакції — надсилає його фоновий воркер
+    subject, html_content = build_verification_email(token)
+    enqueue_email(db, email, subject, html_content)
+    await db.commit()
+    mail_worker.notify()
 
     return HTMLResponse(f"""
         <div style='text-align: center; margin-top: 50px; font-family: sans-serif;'>
@@ -220,14 +255,15 @@ async def register_user(username: str = Form(...), email: str = Form(...), passw
     """)
 
 @app.get("/verify/{token}")
-async def verify_email(token: str, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.verify_token == token).first()
+async def verify_email(token: str, db: AsyncSession = Depends(get_primary_db)):
+    user = await db.scalar(select(UserDB).where(UserDB.verify_token == token))
     if not user:
         return HTMLResponse("<h3 style='text-align:center; color:red;'>❌ Недійсне посилання або акаунт вже підтверджено!</h3>")
     
     user.is_verified = True
     user.verify_token = ""
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(user.id)
     return HTMLResponse("<h3 style='text-align:center; color:green; mt-5'>✅ Пошту успішно підтверджено! Тепер ви можете <a href='/login'>увійти</a>.</h3>")
 
 # --- ВХІД ---
@@ -236,16 +272,31 @@ async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @app.post("/login")
-async def login_user(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.username == username).first()
+async def login_user(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    await rate_limiter.check("login", ip=client_ip(request), user=username.strip().lower())
+    user = await db.scalar(select(UserDB).where(UserDB.username == username))
     
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    if not user:
         return HTMLResponse("<h3>Невірний логін або пароль! <a href='/login'>Спробувати ще раз</a></h3>")
+
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
+        return HTMLResponse("<h3>Невірний логін або пароль! <a href='/login'>Спробувати ще раз</a></h3>")
+
+    # Параметри CryptContext змінились — тихо оновлюємо хеш
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     
     if not user.is_verified:
         return HTMLResponse("<h3>⚠️ Ваш акаунт не підтверджено! Перевірте електронну пошту. <a href='/login'>Назад</a></h3>")
         
-    request.session["user"] = user.username
+    # Нова сесія, але час останнього запису лишається: наступні GET ще читають з основної БД
+    write_at = request.session.get("db_write_at")
+    request.session.clear()
+    request.session["user_id"] = user.id
+    if write_at:
+        request.session["db_write_at"] = write_at
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/logout")
@@ -255,266 +306,412 @@ async def logout(request: Request):
 
 # --- МІЙ ПРОФІЛЬ ---
 @app.get("/profile", response_class=HTMLResponse)
-async def profile_page(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def profile_page(request: Request, db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return RedirectResponse(url="/login", status_code=303)
     
     return templates.TemplateResponse("profile.html", {"request": request, "user_data": current_user})
 
+def avatar_error(error: AvatarRejected):
+    return HTMLResponse(f"<h3 style='text-align:center; color:red; margin-top:50px;'>❌ Помилка: {error}! <br><br><a href='/profile'>Повернутися назад</a></h3>")
+
 @app.post("/profile")
-async def update_profile(
-    request: Request, 
-    bio: str = Form(""), 
-    avatar_file: UploadFile = File(None),
-    db: Session = Depends(get_db)
-):
-    current_user = get_current_user(request, db)
+async def update_profile(request: Request, db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if current_user:
-        current_user.bio = bio
-        
-        if avatar_file and avatar_file.filename:
-            allowed_extensions = {"jpg", "jpeg", "png", "webp"}
-            file_extension = avatar_file.filename.split(".")[-1].lower()
-            
-            if file_extension not in allowed_extensions:
-                return HTMLResponse("<h3 style='text-align:center; color:red; margin-top:50px;'>❌ Помилка: Можна завантажувати тільки картинки (.jpg, .png, .webp)! <br><br><a href='/profile'>Повернутися назад</a></h3>")
-            
-            new_filename = f"avatar_{current_user.id}_{uuid.uuid4().hex[:8]}.{file_extension}"
-            file_path = os.path.join(UPLOAD_DIR, new_filename)
-            
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(avatar_file.file, buffer)
-            
-            current_user.avatar_url = f"/{file_path}"
-            
-        db.commit()
+        # Форму розбираємо самі, з лімітом на тіло запиту (див. limited_form_request)
+        try:
+            async with limited_form_request(request).form() as form:
+                bio = form.get("bio", "")
+                avatar_file = form.get("avatar_file")
+                # Кешований користувач лише для читання — змінюємо сам рядок у БД
+                current_user = await db.get(UserDB, current_user.id)
+                current_user.bio = bio
+                old_avatar_url = current_user.avatar_url
+                if getattr(avatar_file, "filename", None):
+                    current_user.avatar_url = await save_avatar(avatar_file)
+        except AvatarRejected as e:
+            return avatar_error(e)
+
+        await db.commit()
+        user_cache.invalidate(current_user.id)
+
+        # Стару аватарку видаляємо, якщо на неї більше ніхто не посилається (дедуплікація)
+        if old_avatar_url and old_avatar_url != current_user.avatar_url:
+            references = await db.scalar(select(func.count()).select_from(UserDB).where(UserDB.avatar_url == old_avatar_url))
+            await remove_avatar_if_unused(old_avatar_url, references)
     return RedirectResponse(url="/profile", status_code=303)
 
 # --- КАТАЛОГИ ---
-@app.get("/films", response_class=HTMLResponse)
-async def films_list(request: Request, q: str = None, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    if not current_user: return RedirectResponse(url="/login", status_code=303)
-    query = db.query(FilmDB).filter(FilmDB.owner_id == current_user.id)
-    if q: query = query.filter(FilmDB.title.ilike(f"%{q}%"))
-    films = query.order_by(FilmDB.rating.desc()).all()
-    return templates.TemplateResponse("films.html", {"request": request, "films": films, "user": current_user.username})
-
-@app.get("/books", response_class=HTMLResponse)
-async def books_list(request: Request, q: str = None, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+# Один набір обробників на всі категорії. Для кожної категорії — шаблон сторінки,
+# ім'я списку в шаблоні та старі URL (/films, /add_film, /share_film/1 ...), що лишаються аліасами.
+CATALOG_PAGES = {
+    "films": {"template": "films.html", "items": "films", "list_path": "/films", "singular": "film"},
+    "books": {"template": "books.html", "items": "books", "list_path": "/books", "singular": "book"},
+    "music": {"template": "music.html", "items": "music", "list_path": "/music", "singular": "music"},
+    "videos": {"template": "video.html", "items": "videos", "list_path": "/video", "singular": "video"},
+}
+
+catalog_router = APIRouter()
+
+async def get_owned_item(db: AsyncSession, category: str, item_id: int, user):
+    return await db.scalar(select(ItemDB).where(ItemDB.id == item_id, ItemDB.category == category, ItemDB.owner_id == user.id))
+
+def owned_item_condition(category: str, item_id: int, user):
+    # Перевірка власника — частина WHERE, тож зміна й перевірка йдуть одним індексованим запитом
+    return (ItemDB.id == item_id, ItemDB.category == category, ItemDB.owner_id == user.id)
+
+async def toggle_item_share(db: AsyncSession, category: str, item_id: int, user):
+    # Один UPDATE ... RETURNING замість SELECT + UPDATE
+    query = update(ItemDB).where(*owned_item_condition(category, item_id, user)).values(is_shared=not_(ItemDB.is_shared)).returning(ItemDB)
+    item = await db.scalar(query)
+    if item:
+        await bump_catalog_version(db, user.id, {f"{category}_shared": 1 if item.is_shared else -1})
+        await db.commit()
+        feed_cache.sync(category, item, user.username)
+    return item
+
+async def delete_owned_item(db: AsyncSession, category: str, item_id: int, user):
+    query = delete(ItemDB).where(*owned_item_condition(category, item_id, user)).returning(ItemDB.id, ItemDB.is_shared)
+    deleted = (await db.execute(query)).first()
+    if deleted:
+        await bump_catalog_version(db, user.id, item_deltas(category, deleted.is_shared, sign=-1))
+        await db.commit()
+        feed_cache.remove(category, item_id)
+    return deleted
+
+async def update_owned_item(db: AsyncSession, category: str, item_id: int, user, values: dict):
+    query = update(ItemDB).where(*owned_item_condition(category, item_id, user)).values(**values).returning(ItemDB)
+    item = await db.scalar(query)
+    if item:
+        await bump_catalog_version(db, user.id)
+        await db.commit()
+        feed_cache.sync(category, item, user.username)
+    return item
+
+def wants_json(request: Request):
+    return "application/json" in request.headers.get("accept", "")
+
+def item_fragment(request: Request, category: str, item):
+    # Відповідь часткових оновлень: HTML одного запису для сторінки каталогу або JSON для клієнтів API
+    if wants_json(request):
+        return JSONResponse({"item": item_to_dict(item)})
+    return templates.TemplateResponse("_catalog_item.html", {"request": request, "item": item, "category": category})
+
+async def catalog_list(category: str, request: Request, q: str = None, db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user: return RedirectResponse(url="/login", status_code=303)
-    query = db.query(BookDB).filter(BookDB.owner_id == current_user.id)
-    if q: query = query.filter(BookDB.title.ilike(f"%{q}%"))
-    books = query.order_by(BookDB.rating.desc()).all()
-    return templates.TemplateResponse("books.html", {"request": request, "books": books, "user": current_user.username})
-
-@app.get("/music", response_class=HTMLResponse)
-async def music_list(request: Request, q: str = None, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    if not current_user: return RedirectResponse(url="/login", status_code=303)
-    query = db.query(MusicDB).filter(MusicDB.owner_id == current_user.id)
-    if q: query = query.filter(MusicDB.title.ilike(f"%{q}%"))
-    music = query.order_by(MusicDB.rating.desc()).all()
-    return templates.TemplateResponse("music.html", {"request": request, "music": music, "user": current_user.username})
-
-@app.get("/video", response_class=HTMLResponse)
-async def video_list(request: Request, q: str = None, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    if not current_user: return RedirectResponse(url="/login", status_code=303)
-    query = db.query(VideoDB).filter(VideoDB.owner_id == current_user.id)
-    if q: query = query.filter(VideoDB.title.ilike(f"%{q}%"))
-    videos = query.order_by(VideoDB.rating.desc()).all()
-    return templates.TemplateResponse("video.html", {"request": request, "videos": videos, "user": current_user.username})
-
-# --- ДОДАВАННЯ ---
-@app.post("/add_film")
-async def add_new_film(request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), image_url: str = Form(""), db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    if current_user:
-        new_item = FilmDB(title=title, author=author, rating=rating, link=link, image_url=image_url, owner_id=current_user.id)
-        db.add(new_item)
-        db.commit()
-    return RedirectResponse(url="/films", status_code=303)
-
-@app.post("/add_book")
-async def add_new_book(request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    if current_user:
-        new_item = BookDB(title=title, author=author, rating=rating, link=link, owner_id=current_user.id)
-        db.add(new_item)
-        db.commit()
-    return RedirectResponse(url="/books", status_code=303)
-
-@app.post("/add_music")
-async def add_new_music(request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+    query = select(ItemDB).where(ItemDB.owner_id == current_user.id, ItemDB.category == category)
+    if q: query = query.where(search_condition(db, current_user.id, q))
+    items = (await db.scalars(query.order_by(ItemDB.rating.desc()))).all()
+    page = CATALOG_PAGES[category]
+    return templates.TemplateResponse(page["template"], {"request": request, page["items"]: items, "user": current_user.username})
+
+async def catalog_add(category: str, request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), image_url: str = Form(""), db: AsyncSession = Depends(get_db)):
+    check_rating(rating)
+    current_user = await get_current_user(request, db)
     if current_user:
-        new_item = MusicDB(title=title, author=author, rating=rating, link=link, owner_id=current_user.id)
+        new_item = ItemDB(category=category, title=title, author=author, rating=rating, link=link, image_url=image_url, owner_id=current_user.id)
         db.add(new_item)
-        db.commit()
-    return RedirectResponse(url="/music", status_code=303)
+        await bump_catalog_version(db, current_user.id, item_deltas(category, is_shared=False))
+        await db.commit()
+        cover_service.prefetch(image_url)
+    return RedirectResponse(url=f"/catalog/{category}", status_code=303)
 
-@app.post("/add_video")
-async def add_new_video(request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    if current_user:
-        new_item = VideoDB(title=title, author=author, rating=rating, link=link, owner_id=current_user.id)
-        db.add(new_item)
-        db.commit()
-    return RedirectResponse(url="/video", status_code=303)
-
-# --- ВИДАЛЕННЯ ---
-@app.get("/delete_film/{item_id}")
-async def delete_film(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(FilmDB).filter(FilmDB.id == item_id, FilmDB.owner_id == user.id).first()
-        if item:
-            db.delete(item)
-            db.commit()
-    return RedirectResponse(url="/films", status_code=303)
-
-@app.get("/delete_book/{item_id}")
-async def delete_book(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(BookDB).filter(BookDB.id == item_id, BookDB.owner_id == user.id).first()
-        if item:
-            db.delete(item)
-            db.commit()
-    return RedirectResponse(url="/books", status_code=303)
-
-@app.get("/delete_music/{item_id}")
-async def delete_music(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(MusicDB).filter(MusicDB.id == item_id, MusicDB.owner_id == user.id).first()
-        if item:
-            db.delete(item)
-            db.commit()
-    return RedirectResponse(url="/music", status_code=303)
-
-@app.get("/delete_video/{item_id}")
-async def delete_video(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(VideoDB).filter(VideoDB.id == item_id, VideoDB.owner_id == user.id).first()
-        if item:
-            db.delete(item)
-            db.commit()
-    return RedirectResponse(url="/video", status_code=303)
-
-# --- РЕПОСТИ (ПОШИРЕННЯ) ---
-@app.get("/share_film/{item_id}")
-async def share_film(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def catalog_delete(category: str, item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user(request, db)
     if user:
-        item = db.query(FilmDB).filter(FilmDB.id == item_id, FilmDB.owner_id == user.id).first()
-        if item:
-            item.is_shared = not item.is_shared
-            db.commit()
-    return RedirectResponse(url="/films", status_code=303)
-
-@app.get("/share_book/{item_id}")
-async def share_book(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(BookDB).filter(BookDB.id == item_id, BookDB.owner_id == user.id).first()
-        if item:
-            item.is_shared = not item.is_shared
-            db.commit()
-    return RedirectResponse(url="/books", status_code=303)
-
-@app.get("/share_music/{item_id}")
-async def share_music(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(MusicDB).filter(MusicDB.id == item_id, MusicDB.owner_id == user.id).first()
-        if item:
-            item.is_shared = not item.is_shared
-            db.commit()
-    return RedirectResponse(url="/music", status_code=303)
-
-@app.get("/share_video/{item_id}")
-async def share_video(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(VideoDB).filter(VideoDB.id == item_id, VideoDB.owner_id == user.id).first()
-        if item:
-            item.is_shared = not item.is_shared
-            db.commit()
-    return RedirectResponse(url="/video", status_code=303)
-
-# --- РЕДАГУВАННЯ ЗАПИСІВ ---
-@app.get("/edit_film/{item_id}", response_class=HTMLResponse)
-async def edit_film_page(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if not user: return RedirectResponse(url="/login", status_code=303)
-    item = db.query(FilmDB).filter(FilmDB.id == item_id, FilmDB.owner_id == user.id).first()
-    return templates.TemplateResponse("edit.html", {"request": request, "item": item, "category": "film", "return_url": "films"})
-
-@app.post("/edit_film/{item_id}")
-async def edit_film_post(item_id: int, request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), image_url: str = Form(""), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(FilmDB).filter(FilmDB.id == item_id, FilmDB.owner_id == user.id).first()
-        if item:
-            item.title, item.author, item.rating, item.link, item.image_url = title, author, rating, link, image_url
-            db.commit()
-    return RedirectResponse(url="/films", status_code=303)
-
-@app.get("/edit_book/{item_id}", response_class=HTMLResponse)
-async def edit_book_page(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if not user: return RedirectResponse(url="/login", status_code=303)
-    item = db.query(BookDB).filter(BookDB.id == item_id, BookDB.owner_id == user.id).first()
-    return templates.TemplateResponse("edit.html", {"request": request, "item": item, "category": "book", "return_url": "books"})
+        await delete_owned_item(db, category, item_id, user)
+    return RedirectResponse(url=f"/catalog/{category}", status_code=303)
 
-@app.post("/edit_book/{item_id}")
-async def edit_book_post(item_id: int, request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def catalog_share(category: str, item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user(request, db)
     if user:
-        item = db.query(BookDB).filter(BookDB.id == item_id, BookDB.owner_id == user.id).first()
-        if item:
-            item.title, item.author, item.rating, item.link = title, author, rating, link
-            db.commit()
-    return RedirectResponse(url="/books", status_code=303)
-
-@app.get("/edit_music/{item_id}", response_class=HTMLResponse)
-async def edit_music_page(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if not user: return RedirectResponse(url="/login", status_code=303)
-    item = db.query(MusicDB).filter(MusicDB.id == item_id, MusicDB.owner_id == user.id).first()
-    return templates.TemplateResponse("edit.html", {"request": request, "item": item, "category": "music", "return_url": "music"})
+        await toggle_item_share(db, category, item_id, user)
+    return RedirectResponse(url=f"/catalog/{category}", status_code=303)
 
-@app.post("/edit_music/{item_id}")
-async def edit_music_post(item_id: int, request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
-    if user:
-        item = db.query(MusicDB).filter(MusicDB.id == item_id, MusicDB.owner_id == user.id).first()
-        if item:
-            item.title, item.author, item.rating, item.link = title, author, rating, link
-            db.commit()
-    return RedirectResponse(url="/music", status_code=303)
-
-@app.get("/edit_video/{item_id}", response_class=HTMLResponse)
-async def edit_video_page(item_id: int, request: Request, db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def catalog_edit_page(category: str, item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await get_current_user(request, db)
     if not user: return RedirectResponse(url="/login", status_code=303)
-    item = db.query(VideoDB).filter(VideoDB.id == item_id, VideoDB.owner_id == user.id).first()
-    return templates.TemplateResponse("edit.html", {"request": request, "item": item, "category": "video", "return_url": "video"})
+    item = await get_owned_item(db, category, item_id, user)
+    return templates.TemplateResponse("edit.html", {"request": request, "item": item, "category": category, "user": user.username})
 
-@app.post("/edit_video/{item_id}")
-async def edit_video_post(item_id: int, request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), db: Session = Depends(get_db)):
-    user = get_current_user(request, db)
+async def catalog_edit_post(category: str, item_id: int, request: Request, title: str = Form(...), author: str = Form(...), rating: float = Form(...), link: str = Form(""), image_url: str = Form(""), db: AsyncSession = Depends(get_db)):
+    check_rating(rating)
+    user = await get_current_user(request, db)
     if user:
-        item = db.query(VideoDB).filter(VideoDB.id == item_id, VideoDB.owner_id == user.id).first()
-        if item:
-            item.title, item.author, item.rating, item.link = title, author, rating, link
-            db.commit()
-    return RedirectResponse(url="/video", status_code=303)
+        values = {"title": title, "author": author, "rating": rating, "link": link, "image_url": image_url}
+        await update_owned_item(db, category, item_id, user, values)
+        cover_service.prefetch(image_url)
+    return RedirectResponse(url=f"/catalog/{category}", status_code=303)
+
+# --- Часткові оновлення: лише змінений запис (HTML-фрагмент або JSON), без перерендеру списку ---
+async def catalog_share_fragment(category: str, item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await require_api_user(request, db)
+    item = await toggle_item_share(db, category, item_id, user)
+    if not item:
+        raise HTTPException(status_code=404, detail="Запис не знайдено")
+    return item_fragment(request, category, item)
+
+async def catalog_delete_fragment(category: str, item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await require_api_user(request, db)
+    if not await delete_owned_item(db, category, item_id, user):
+        raise HTTPException(status_code=404, detail="Запис не знайдено")
+    if wants_json(request):
+        return JSONResponse({"deleted": item_id})
+    # Порожній фрагмент: запис просто зникає зі сторінки
+    return HTMLResponse("")
+
+def check_rating(rating: float):
+    # Як в імпорті: 1–10 і скінченне число — NaN чи 500 ламають курсори (rating, id) стрічки та API
+    if not math.isfinite(rating) or not 1 <= rating <= 10:
+        raise HTTPException(status_code=400, detail="rating має бути від 1 до 10")
+    return rating
+
+async def catalog_update_fragment(category: str, item_id: int, request: Request, title: str = Form(None), author: str = Form(None), rating: float = Form(None), link: str = Form(None), image_url: str = Form(None), db: AsyncSession = Depends(get_db)):
+    user = await require_api_user(request, db)
+    # PATCH: змінюються лише передані поля
+    values = {name: value for name, value in (("title", title), ("author", author), ("rating", rating), ("link", link), ("image_url", image_url)) if value is not None}
+    if not values:
+        raise HTTPException(status_code=400, detail="Немає полів для зміни")
+    if rating is not None:
+        check_rating(rating)
+    item = await update_owned_item(db, category, item_id, user, values)
+    if not item:
+        raise HTTPException(status_code=404, detail="Запис не знайдено")
+    cover_service.prefetch(item.image_url)
+    return item_fragment(request, category, item)
+
+# --- Пакетні операції: один UPDATE / DELETE з перевіркою власника на весь список id ---
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "1000"))
+
+def is_item_id(value):
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    return type(value) is int and 0 < value < 2 ** 31
+
+async def read_batch(request: Request):
+    # Приймає JSON {"ids": [...], ...} від скриптів або форму з чекбоксами ids зі сторінки каталогу
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некоректний JSON")
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=400, detail="Очікувався JSON-об'єкт")
+        raw_ids = payload.get("ids", [])
+    else:
+        form = await request.form()
+        payload = dict(form)
+        raw_ids = form.getlist("ids")
+    # Лише список цілих (з форми — рядків із цифр): рядок "15" не можна обходити посимвольно,
+    # а 2.9 чи true — мовчки перетворювати на 2 і 1
+    if not isinstance(raw_ids, list) or not all(is_item_id(item_id) for item_id in raw_ids):
+        raise HTTPException(status_code=400, detail="ids мають бути списком цілих чисел")
+    ids = sorted({int(item_id) for item_id in raw_ids})
+    if not ids:
+        raise HTTPException(status_code=400, detail="Не вибрано жодного запису")
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Не більше {BATCH_MAX_IDS} записів за раз")
+    return ids, payload
+
+def batch_response(request: Request, category: str, result: dict):
+    if wants_json(request):
+        return JSONResponse(result)
+    return RedirectResponse(url=f"/catalog/{category}", status_code=303)
+
+def owned_items_condition(category: str, ids, user):
+    return (ItemDB.id.in_(ids), ItemDB.category == category, ItemDB.owner_id == user.id)
+
+async def catalog_batch_delete(category: str, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await require_api_user(request, db)
+    ids, _ = await read_batch(request)
+    query = delete(ItemDB).where(*owned_items_condition(category, ids, user)).returning(ItemDB.id, ItemDB.is_shared)
+    deleted = (await db.execute(query)).all()
+    if deleted:
+        shared = sum(1 for row in deleted if row.is_shared)
+        await bump_catalog_version(db, user.id, {f"{category}_count": -len(deleted), f"{category}_shared": -shared})
+        await db.commit()
+        for row in deleted:
+            feed_cache.remove(category, row.id)
+    return batch_response(request, category, {"deleted": sorted(row.id for row in deleted)})
+
+async def catalog_batch_share(category: str, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await require_api_user(request, db)
+    ids, payload = await read_batch(request)
+    shared = payload.get("shared", True)
+    if isinstance(shared, str):
+        shared = shared.strip().lower() in ("1", "true", "yes", "on")
+    shared = bool(shared)
+    # Записи, що вже в потрібному стані, не чіпаються — лічильник змінюється рівно на кількість змінених
+    query = (
+        update(ItemDB)
+        .where(*owned_items_condition(category, ids, user), ItemDB.is_shared != shared)
+        .values(is_shared=shared)
+        .returning(ItemDB)
+    )
+    items = (await db.scalars(query)).all()
+    if items:
+        await bump_catalog_version(db, user.id, {f"{category}_shared": len(items) if shared else -len(items)})
+        await db.commit()
+        for item in items:
+            feed_cache.sync(category, item, user.username)
+    return batch_response(request, category, {"updated": sorted(item.id for item in items), "shared": shared})
+
+async def catalog_batch_rating(category: str, request: Request, db: AsyncSession = Depends(get_db)):
+    user = await require_api_user(request, db)
+    ids, payload = await read_batch(request)
+    try:
+        rating = float(payload.get("rating"))
+    except (TypeError, ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="rating має бути числом")
+    check_rating(rating)
+    query = update(ItemDB).where(*owned_items_condition(category, ids, user)).values(rating=rating).returning(ItemDB)
+    items = (await db.scalars(query)).all()
+    if items:
+        await bump_catalog_version(db, user.id)
+        await db.commit()
+        for item in items:
+            feed_cache.sync(category, item, user.username)
+    return batch_response(request, category, {"updated": sorted(item.id for item in items), "rating": rating})
+
+CATALOG_ROUTES = [
+    # (шлях, старий шлях, метод, обробник)
+    # Пакетні маршрути — першими, інакше /batch/delete перехопить /{item_id}/delete
+    ("/catalog/{category}/batch/delete", None, "POST", catalog_batch_delete),
+    ("/catalog/{category}/batch/share", None, "POST", catalog_batch_share),
+    ("/catalog/{category}/batch/rating", None, "POST", catalog_batch_rating),
+    ("/catalog/{category}", "{list_path}", "GET", catalog_list),
+    ("/catalog/{category}/add", "/add_{singular}", "POST", catalog_add),
+    ("/catalog/{category}/{item_id}/delete", "/delete_{singular}/{item_id}", "GET", catalog_delete),
+    ("/catalog/{category}/{item_id}/share", "/share_{singular}/{item_id}", "GET", catalog_share),
+    ("/catalog/{category}/{item_id}/edit", "/edit_{singular}/{item_id}", "GET", catalog_edit_page),
+    ("/catalog/{category}/{item_id}/edit", "/edit_{singular}/{item_id}", "POST", catalog_edit_post),
+    # Часткові оновлення (без старих аліасів)
+    ("/catalog/{category}/{item_id}/share", None, "POST", catalog_share_fragment),
+    ("/catalog/{category}/{item_id}/delete", None, "POST", catalog_delete_fragment),
+    ("/catalog/{category}/{item_id}", None, "PATCH", catalog_update_fragment),
+]
+
+for category, page in CATALOG_PAGES.items():
+    for path, legacy_path, method, handler in CATALOG_ROUTES:
+        endpoint = partial(handler, category)
+        catalog_router.add_api_route(path.replace("{category}", category), endpoint, methods=[method], response_class=HTMLResponse)
+        if legacy_path:
+            catalog_router.add_api_route(legacy_path.format(item_id="{item_id}", **page), endpoint, methods=[method], response_class=HTMLResponse, include_in_schema=False)
+
+app.include_router(catalog_router)
+
+# --- МАСОВИЙ ІМПОРТ / ЕКСПОРТ ---
+@app.post("/catalog/import")
+async def catalog_import(request: Request, import_file: UploadFile = File(...), file_format: str = Form(""), category: str = Form(""), db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
+    if not current_user: return RedirectResponse(url="/login", status_code=303)
+    report = await import_items(db, import_file, current_user.id, detect_format(import_file.filename, file_format), category or None)
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse(report)
+    return templates.TemplateResponse("profile.html", {"request": request, "user_data": current_user, "import_report": report})
+
+@app.get("/catalog/export")
+async def catalog_export(request: Request, format: str = "csv", db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
+    if not current_user: return RedirectResponse(url="/login", status_code=303)
+    file_format = detect_format("", format)
+    media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="globify-{current_user.username}.{file_format}"'}
+    return StreamingResponse(export_items(current_user.id, file_format), media_type=f"{media_type}; charset=utf-8", headers=headers)
+
+# --- JSON API v1 ---
+# Ті самі каталоги для мобільних клієнтів і скриптів. Списки віддаються сторінками
+# за курсором і з ETag від версії каталогу: якщо нічого не змінилося,
+# відповідь 304 коштує один пошук за первинним ключем.
+api_router = APIRouter(prefix="/api/v1")
+
+def require_category(category: str):
+    if category not in CATEGORIES:
+        raise HTTPException(status_code=404, detail="Невідома категорія")
+
+def require_fields(fields: str):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/catalog")
+async def api_catalog(request: Request, db: AsyncSession = Depends(get_db)):
+    current_user = await require_api_user(request, db)
+    stats = await load_catalog_stats(db, current_user.id)
+    headers = catalog_validators(stats)
+    if is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"version": stats.version, "counts": category_counts(stats), "shared": shared_counts(stats)}, headers=headers)
+
+@api_router.get("/catalog/{category}")
+async def api_catalog_list(category: str, request: Request, cursor: str = None, limit: int = API_PAGE_SIZE, fields: str = None, db: AsyncSession = Depends(get_db)):
+    current_user = await require_api_user(request, db)
+    require_category(category)
+    selected = require_fields(fields)
+    position = decode_feed_cursor(cursor) if cursor else None
+    if cursor and not position:
+        raise HTTPException(status_code=400, detail="Некоректний курсор")
+
+    stats = await load_catalog_stats(db, current_user.id)
+    headers = catalog_validators(stats)
+    if is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    items, next_cursor = await load_items_page(db, current_user.id, category, selected, position, max(1, min(limit, API_MAX_PAGE_SIZE)))
+    return JSONResponse({"version": stats.version, "items": items, "next_cursor": next_cursor}, headers=headers)
+
+@api_router.get("/catalog/{category}/{item_id}")
+async def api_catalog_item(category: str, item_id: int, request: Request, fields: str = None, db: AsyncSession = Depends(get_db)):
+    current_user = await require_api_user(request, db)
+    require_category(category)
+    selected = require_fields(fields)
+    stats = await load_catalog_stats(db, current_user.id)
+    headers = catalog_validators(stats)
+    if is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    item = await load_item(db, current_user.id, category, item_id, selected)
+    if not item:
+        raise HTTPException(status_code=404, detail="Запис не знайдено")
+    return JSONResponse(item, headers=headers)
+
+app.include_router(api_router)
+
+# --- ПОШУК ПО ВСІХ КАТАЛОГАХ ---
+@app.get("/search", response_class=HTMLResponse)
+async def search_page(request: Request, q: str = "", db: AsyncSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
+    if not current_user: return RedirectResponse(url="/login", status_code=303)
+    q = q.strip()
+    results = await search_items(db, current_user.id, q) if q else []
+    return templates.TemplateResponse("search.html", {"request": request, "results": results, "q": q, "user": current_user.username})
+
+# --- ОБКЛАДИНКИ: локальні мініатюри замість хотлінків на сторонні сайти ---
+@app.get("/covers/{size}/{key}.webp", include_in_schema=False)
+async def cover_image(size: str, key: str, u: str = ""):
+    if size not in COVER_SIZES:
+        raise HTTPException(status_code=404)
+    path = cover_service.cache.lookup(key, size)
+    if not path:
+        # Джерело приймаємо лише з підписаним ключем, інакше це був би відкритий проксі
+        if not is_signed(key, u):
+            raise HTTPException(status_code=404)
+        if await cover_service.wait(key, u):
+            path = cover_service.cache.lookup(key, size)
+    if not path:
+        # Мініатюра ще не готова або джерело недоступне — браузер піде за оригіналом
+        return RedirectResponse(url=u, status_code=307, headers={"Cache-Control": "no-store"})
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": COVER_CACHE_CONTROL})
+
+# --- МЕТРИКИ (Prometheus) ---
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    # Якщо задано METRICS_TOKEN, скрейпер має надіслати його як Bearer-токен
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return PlainTextResponse("Unauthorized", status_code=401)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/contacts", response_class=HTMLResponse)
 async def contacts(request: Request):
@@ -526,4 +723,7 @@ async def contacts(request: Request):
 
 # cd my_homework/my_flask_site
 # source ../../venv/Scripts/activate
-# uvicorn main:app --reload
\ No newline at end of file
+# uvicorn main:app --reload --env-file .env
+# На Render / за nginx — з адресою клієнта з X-Forwarded-For, інакше ліміти входу спільні на весь сайт:
+# uvicorn main:app --host 0.0.0.0 --port $PORT --proxy-headers --forwarded-allow-ips='*'
+# (або RATE_LIMIT_TRUSTED_PROXIES — див. ratelimit.py)
\ No newline at end of file
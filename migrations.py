@@ -0,0 +1,150 @@
+from sqlalchemy import text, inspect
+from database import engine, Base
+from models import ItemDB, CatalogStatsDB
+from catalog_stats import COUNT_COLUMNS, reconcile_catalog_stats
+
+# Кожна міграція виконується один раз і записується в schema_migrations.
+# Нові бази отримують ту саму схему через Base.metadata.create_all,
+# тому кроки мають бути ідемпотентними (IF NOT EXISTS).
+CATALOG_TABLES = ("films", "books", "music", "videos")
+
+# Слот категорії в rowid пошукового індексу SQLite: rowid = id * 4 + слот
+SEARCH_SLOTS = {"films": 0, "books": 1, "music": 2, "videos": 3}
+
+
+def _legacy_tables(conn):
+    # Старі таблиці категорій є лише в базах, створених до міграції 0003
+    inspector = inspect(conn)
+    return [table for table in CATALOG_TABLES if inspector.has_table(table)]
+
+
+def create_catalog_indexes(conn):
+    for table in _legacy_tables(conn):
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_owner_shared_rating ON {table} (owner_id, is_shared, rating)"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_shared_rating_id ON {table} (is_shared, rating, id)"))
+
+
+def create_search_index(conn):
+    tables = _legacy_tables(conn)
+    if not tables:
+        return
+    if conn.dialect.name == "postgresql":
+        # Триграмні GIN-індекси обслуговують ILIKE '%q%' по назві та автору
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for table in tables:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_title_trgm ON {table} USING gin (title gin_trgm_ops)"))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_author_trgm ON {table} USING gin (author gin_trgm_ops)"))
+    elif conn.dialect.name == "sqlite":
+        # FTS5 з триграмним токенізатором — той самий пошук підрядка, що й ILIKE, але по індексу.
+        # Синхронізацію з таблицями каталогу тримають тригери.
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS catalog_search USING fts5(title, author, owner_id UNINDEXED, tokenize = 'trigram')"))
+        for table in tables:
+            slot = SEARCH_SLOTS[table]
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO catalog_search (rowid, title, author, owner_id) VALUES (new.id * 4 + {slot}, new.title, new.author, new.owner_id);
+                END"""))
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF title, author, owner_id ON {table} BEGIN
+                    DELETE FROM catalog_search WHERE rowid = old.id * 4 + {slot};
+                    INSERT INTO catalog_search (rowid, title, author, owner_id) VALUES (new.id * 4 + {slot}, new.title, new.author, new.owner_id);
+                END"""))
+            conn.execute(text(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN
+                    DELETE FROM catalog_search WHERE rowid = old.id * 4 + {slot};
+                END"""))
+            conn.execute(text(f"INSERT INTO catalog_search (rowid, title, author, owner_id) SELECT id * 4 + {slot}, title, author, owner_id FROM {table}"))
+
+
+def migrate_to_items(conn):
+    # Чотири однакові таблиці -> одна items з дискримінатором category.
+    # Старі таблиці лишаються недоторканими для відкату; їх можна видалити окремо.
+    ItemDB.__table__.create(conn, checkfirst=True)
+    if not conn.execute(text("SELECT 1 FROM items LIMIT 1")).first():
+        for table in _legacy_tables(conn):
+            conn.execute(text(
+                f"INSERT INTO items (category, title, author, rating, link, owner_id, is_shared, image_url) "
+                f"SELECT '{table}', title, author, rating, link, owner_id, is_shared, image_url FROM {table} ORDER BY id"
+            ))
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_items_title_trgm ON items USING gin (title gin_trgm_ops)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_items_author_trgm ON items USING gin (author gin_trgm_ops)"))
+    elif conn.dialect.name == "sqlite":
+        # Пошуковий індекс переїжджає на items: rowid у FTS = items.id
+        for table in CATALOG_TABLES:
+            for action in ("insert", "update", "delete"):
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_search_{action}"))
+        conn.execute(text("DROP TABLE IF EXISTS catalog_search"))
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS items_search USING fts5(title, author, owner_id UNINDEXED, category UNINDEXED, tokenize = 'trigram')"))
+        conn.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS items_search_insert AFTER INSERT ON items BEGIN
+                INSERT INTO items_search (rowid, title, author, owner_id, category) VALUES (new.id, new.title, new.author, new.owner_id, new.category);
+            END"""))
+        conn.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS items_search_update AFTER UPDATE OF title, author, owner_id, category ON items BEGIN
+                DELETE FROM items_search WHERE rowid = old.id;
+                INSERT INTO items_search (rowid, title, author, owner_id, category) VALUES (new.id, new.title, new.author, new.owner_id, new.category);
+            END"""))
+        conn.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS items_search_delete AFTER DELETE ON items BEGIN
+                DELETE FROM items_search WHERE rowid = old.id;
+            END"""))
+        conn.execute(text("DELETE FROM items_search"))
+        conn.execute(text("INSERT INTO items_search (rowid, title, author, owner_id, category) SELECT id, title, author, owner_id, category FROM items"))
+
+
+def create_catalog_stats(conn):
+    CatalogStatsDB.__table__.create(conn, checkfirst=True)
+    conn.execute(text(
+        "INSERT INTO catalog_stats (owner_id, version, updated_at) "
+        "SELECT id, 0, CURRENT_TIMESTAMP FROM users WHERE id NOT IN (SELECT owner_id FROM catalog_stats)"
+    ))
+
+
+def add_catalog_counters(conn):
+    # Лічильники записів у catalog_stats; значення одразу заповнює звірка з items
+    existing = {column["name"] for column in inspect(conn).get_columns("catalog_stats")}
+    for column in COUNT_COLUMNS:
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE catalog_stats ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+    reconcile_catalog_stats(conn)
+
+
+MIGRATIONS = [
+    ("0001_catalog_composite_indexes", [create_catalog_indexes]),
+    ("0002_catalog_search_index", [create_search_index]),
+    ("0003_unified_items", [migrate_to_items]),
+    ("0004_catalog_stats", [create_catalog_stats]),
+    ("0005_catalog_counters", [add_catalog_counters]),
+]
+
+
+def run_migrations(bind=engine):
+    with bind.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(100) PRIMARY KEY)"))
+        applied = set(conn.execute(text("SELECT id FROM schema_migrations")).scalars())
+
+    for migration_id, steps in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        with bind.begin() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(text("INSERT INTO schema_migrations (id) VALUES (:id)"), {"id": migration_id})
+        print(f"🛠️ Міграцію застосовано: {migration_id}")
+
+
+def init_schema(bind=engine):
+    # Нові таблиці за моделями, потім міграції для вже існуючих баз.
+    # Викликається з lifespan до готовності (DB_MIGRATE_ON_STARTUP) або окремо: python migrations.py
+    Base.metadata.create_all(bind=bind)
+    run_migrations(bind)
+
+
+if __name__ == "__main__":
+    init_schema()
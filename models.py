@@ -0,0 +1,73 @@
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, Index
+from database import Base
+
+class UserDB(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True)
+    email = Column(String, unique=True, index=True)
+    hashed_password = Column(String)
+    is_verified = Column(Boolean, default=False)
+    verify_token = Column(String)
+    avatar_url = Column(String, default="")
+    bio = Column(String, default="")
+
+class ItemDB(Base):
+    # Один каталог на всі категорії (films / books / music / videos).
+    # Колишні таблиці films, books, music, videos перенесено сюди міграцією 0003.
+    __tablename__ = "items"
+    __table_args__ = (
+        # Список категорії та лічильники: WHERE owner_id = ? AND category = ? ORDER BY rating
+        Index("ix_items_owner_category_rating", "owner_id", "category", "rating"),
+        # "Мої закріплені" одразу по всіх категоріях: WHERE owner_id = ? AND is_shared ORDER BY rating
+        Index("ix_items_owner_shared_rating", "owner_id", "is_shared", "rating"),
+        # Глобальна стрічка: WHERE category = ? AND is_shared ORDER BY rating DESC, id DESC
+        Index("ix_items_category_shared_rating_id", "category", "is_shared", "rating", "id"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String, nullable=False)
+    title = Column(String, index=True)
+    author = Column(String)
+    rating = Column(Float)
+    link = Column(String)
+    owner_id = Column(Integer)
+    is_shared = Column(Boolean, default=False)
+    image_url = Column(String, default="")
+
+class CatalogStatsDB(Base):
+    # Один рядок на користувача: версія каталогу зростає з кожною зміною його записів
+    # і служить валідатором ETag для JSON API (updated_at — лише довідково). Лічильники записів
+    # (усього / поширених по категоріях) оновлюються в тій самій транзакції, що й зміна.
+    __tablename__ = "catalog_stats"
+    owner_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+    films_count = Column(Integer, nullable=False, default=0, server_default="0")
+    books_count = Column(Integer, nullable=False, default=0, server_default="0")
+    music_count = Column(Integer, nullable=False, default=0, server_default="0")
+    videos_count = Column(Integer, nullable=False, default=0, server_default="0")
+    films_shared = Column(Integer, nullable=False, default=0, server_default="0")
+    books_shared = Column(Integer, nullable=False, default=0, server_default="0")
+    music_shared = Column(Integer, nullable=False, default=0, server_default="0")
+    videos_shared = Column(Integer, nullable=False, default=0, server_default="0")
+
+class OutboxEmailDB(Base):
+    # Черга вихідних листів: рядок додається в тій самій транзакції, що й користувач,
+    # а надсилає його фоновий воркер (mailer.py)
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String)
+    subject = Column(String)
+    html = Column(Text)
+    status = Column(String, default="pending")  # pending / sent / dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(String, default="")
+    created_at = Column(DateTime)
+    sent_at = Column(DateTime)
+
+# Категорії каталогу (значення ItemDB.category, назва у шаблонах та в URL /catalog/{category})
+CATEGORIES = ("films", "books", "music", "videos")
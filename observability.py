@@ -0,0 +1,284 @@
+import os
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Метрики продуктивності: гістограми латентності по маршрутах, запити в обробці,
+# кількість і час SQL на запит, журнал повільних запитів і експорт у форматі Prometheus.
+# Профілювання окремого запиту вмикається заголовком X-Profile зі значенням PROFILE_TOKEN.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "25"))
+
+logger = logging.getLogger("globify.performance")
+if SLOW_QUERY_LOG:
+    handler = logging.FileHandler(SLOW_QUERY_LOG, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: dict):
+        # Бакети Prometheus кумулятивні: le="0.1" включає все, що <= 0.1
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": str(bound)}, cumulative
+        yield f"{name}_bucket", {**labels, "le": "+Inf"}, self.count
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class RequestStats:
+    # Лічильники поточного запиту; statements збираються лише в режимі профілювання
+    def __init__(self, profiling: bool = False):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = [] if profiling else None
+
+
+request_stats = ContextVar("request_stats", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.responses = Counter()
+        self.queries_per_route = Counter()
+        self.sql_time_per_route = Counter()
+        self.in_flight = 0
+        self.queries = 0
+        self.query_latency = Histogram()
+        self.slow_queries = 0
+        self.slow_requests = 0
+        self.collectors = []
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, stats: RequestStats):
+        with self.lock:
+            self.latency.setdefault((method, route), Histogram()).observe(duration)
+            self.responses[(method, route, str(status))] += 1
+            self.queries_per_route[(method, route)] += stats.queries
+            self.sql_time_per_route[(method, route)] += stats.sql_time
+
+    def observe_query(self, duration: float):
+        with self.lock:
+            self.queries += 1
+            self.query_latency.observe(duration)
+            if duration * 1000 >= SLOW_QUERY_MS:
+                self.slow_queries += 1
+
+    def register(self, collector):
+        # collector() -> [(ім'я, тип, довідка, [(мітки, значення), ...]), ...];
+        # семпл гістограми має ще й власне ім'я: (ім'я_bucket, мітки, значення)
+        self.collectors.append(collector)
+
+    def families(self):
+        with self.lock:
+            yield "http_requests_in_flight", "gauge", "Запити, що зараз обробляються", [({}, self.in_flight)]
+            yield "http_request_duration_seconds", "histogram", "Латентність запитів по маршрутах", [
+                sample
+                for (method, route), histogram in sorted(self.latency.items())
+                for sample in histogram.samples("http_request_duration_seconds", {"method": method, "route": route})
+            ]
+            yield "http_responses_total", "counter", "Відповіді за маршрутом і статусом", [
+                ({"method": method, "route": route, "status": status}, count)
+                for (method, route, status), count in sorted(self.responses.items())
+            ]
+            yield "http_request_sql_queries_total", "counter", "SQL-запити, виконані в межах маршруту", [
+                ({"method": method, "route": route}, count) for (method, route), count in sorted(self.queries_per_route.items())
+            ]
+            yield "http_request_sql_seconds_total", "counter", "Час SQL у межах маршруту", [
+                ({"method": method, "route": route}, value) for (method, route), value in sorted(self.sql_time_per_route.items())
+            ]
+            yield "sql_queries_total", "counter", "Усі SQL-запити процесу", [({}, self.queries)]
+            yield "sql_query_duration_seconds", "histogram", "Латентність SQL-запитів", list(self.query_latency.samples("sql_query_duration_seconds", {}))
+            yield "sql_slow_queries_total", "counter", f"SQL-запити довші за {SLOW_QUERY_MS:g} мс", [({}, self.slow_queries)]
+            yield "http_slow_requests_total", "counter", f"Запити довші за {SLOW_REQUEST_MS:g} мс", [({}, self.slow_requests)]
+        for collector in self.collectors:
+            yield from collector()
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, samples in self.families():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample in samples:
+                sample_name, labels, value = sample if len(sample) == 3 else (name, *sample)
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+metrics = Metrics()
+
+
+# --- Збирачі для наявних компонентів ---
+def stats_collector(prefix: str, help_text: str, stats):
+    # Перетворює словник stats() (кеші, пул хешування, воркер пошти) на gauge-метрики;
+    # вкладені словники стають мітками: feed_cache_entries{key="films"}
+    def collect():
+        for key, value in stats().items():
+            if isinstance(value, dict):
+                yield f"{prefix}_{key}", "gauge", help_text, [({"key": label}, item) for label, item in value.items()]
+            elif isinstance(value, (int, float)):
+                yield f"{prefix}_{key}", "gauge", help_text, [({}, value)]
+    return collect
+
+def pool_collector(pools: dict):
+    # Використання пулу з'єднань: розмір, видані, вільні та overflow для кожного рушія
+    def collect():
+        for metric in ("size", "checkedout", "checkedin", "overflow"):
+            samples = [({"engine": name}, getattr(pool, metric)()) for name, pool in pools.items() if hasattr(pool, metric)]
+            if samples:
+                yield f"db_pool_{metric}", "gauge", f"Пул з'єднань: {metric}", samples
+    return collect
+
+
+# --- SQLAlchemy ---
+def instrument_engine(engine):
+    # Підписка на події рушія: час кожного запиту, облік у поточному HTTP-запиті, slow log
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # На з'єднанні одночасно виконується лише один запит — вистачає одного значення
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info.pop("query_started")
+        metrics.observe_query(duration)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_time += duration
+            if stats.statements is not None:
+                stats.statements.append((" ".join(statement.split()), duration))
+        if duration * 1000 >= SLOW_QUERY_MS:
+            logger.warning("🐢 Повільний SQL (%.1f мс): %s | %.500r", duration * 1000, " ".join(statement.split()), parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # after_cursor_execute для запиту з помилкою не викликається — прибираємо мітку тут
+        if context.connection is not None:
+            context.connection.info.pop("query_started", None)
+
+
+# --- ASGI middleware ---
+profile_lock = threading.Lock()
+
+
+def route_label(scope):
+    # Шаблон маршруту, а не сирий шлях: /feed/{category}, а не /feed/films?cursor=...
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope["path"].startswith("/static/"):
+        return "/static"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profiling = bool(PROFILE_TOKEN) and _header(scope, b"x-profile") == PROFILE_TOKEN
+        stats = RequestStats(profiling)
+        token = request_stats.set(stats)
+        # cProfile один на потік: паралельний запит з X-Profile отримає лише SQL-звіт
+        profiler = cProfile.Profile() if profiling and profile_lock.acquire(blocking=False) else None
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profiling:
+                    duration_ms = (time.perf_counter() - started) * 1000
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-query-count", str(stats.queries).encode()),
+                        (b"server-timing", f'db;dur={stats.sql_time * 1000:.1f};desc="{stats.queries} queries", app;dur={duration_ms:.1f}'.encode()),
+                    ]
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler:
+                profiler.disable()
+                profile_lock.release()
+            metrics.in_flight -= 1
+            request_stats.reset(token)
+            duration = time.perf_counter() - started
+            method, route = scope["method"], route_label(scope)
+            metrics.observe_request(method, route, status, duration, stats)
+            if duration * 1000 >= SLOW_REQUEST_MS:
+                metrics.slow_requests += 1
+                logger.warning("🐢 Повільний запит %s %s: %.1f мс, SQL: %d запитів / %.1f мс", method, scope["path"], duration * 1000, stats.queries, stats.sql_time * 1000)
+            if profiling:
+                logger.warning("%s", profile_report(method, scope["path"], duration, stats, profiler))
+
+
+def _header(scope, name: bytes):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def profile_report(method: str, path: str, duration: float, stats: RequestStats, profiler=None):
+    # Однакові SQL, виконані багато разів за один запит, — типовий N+1
+    lines = [f"🔬 Профіль {method} {path}: {duration * 1000:.1f} мс, SQL: {stats.queries} запитів / {stats.sql_time * 1000:.1f} мс"]
+    repeated = Counter(statement for statement, _ in stats.statements)
+    for statement, count in repeated.most_common():
+        total = sum(duration for text, duration in stats.statements if text == statement)
+        marker = "⚠️ N+1? " if count > 1 else ""
+        lines.append(f"  {marker}{count}× {total * 1000:.1f} мс: {statement[:300]}")
+    if profiler:
+        # cProfile працює весь час запиту, зокрема поки той чекає на await
+        lines.append("  cProfile: враховано й інші корутини event loop, що виконувались під час цього запиту")
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        lines.append(buffer.getvalue())
+    return "\n".join(lines)
@@ -0,0 +1,84 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from passlib.context import CryptContext
+
+# Хешування паролів. Зміна BCRYPT_ROUNDS робить старі хеші "застарілими",
+# і вони тихо перехешовуються при наступному вдалому вході.
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=int(os.getenv("BCRYPT_ROUNDS", "12")))
+
+# bcrypt — це десятки мілісекунд CPU, тож він виконується в окремому пулі,
+# а не в event loop. "thread" достатньо (bcrypt відпускає GIL), "process" — для ізоляції.
+HASH_POOL = os.getenv("HASH_POOL", "thread")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+# Скільки операцій може чекати в черзі понад зайняті воркери, перш ніж ми відмовимо
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _hash(password: str):
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, pool: str = HASH_POOL, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE):
+        self.pool = pool
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _executor(self):
+        # Пул створюється ліниво, щоб імпорт модуля не форкав процеси
+        if self.executor is None:
+            executor_class = ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor
+            self.executor = executor_class(max_workers=self.workers)
+        return self.executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash(self, password: str):
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str):
+        # Повертає (пароль_вірний, новий_хеш_або_None)
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+        }
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+password_hasher = PasswordHasher()
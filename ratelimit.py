@@ -0,0 +1,202 @@
+import os
+import math
+import time
+import ipaddress
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis необов'язковий — потрібен лише для спільного між воркерами бекенду
+    aioredis = None
+
+# Обмеження частоти /login і /register (token bucket) за IP і за логіном. Перевірка йде
+# першою в обробнику — до запиту в БД, bcrypt і листа, тож відмова майже нічого не коштує.
+# Правило "кількість/секунди": стільки спроб підряд, далі — поповнення з тією ж швидкістю; "0" — вимкнено.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_RULES = {
+    "login:ip": os.getenv("RATE_LIMIT_LOGIN_IP", "20/60"),
+    "login:user": os.getenv("RATE_LIMIT_LOGIN_USER", "5/60"),
+    "register:ip": os.getenv("RATE_LIMIT_REGISTER_IP", "5/600"),
+    "register:user": os.getenv("RATE_LIMIT_REGISTER_USER", "3/600"),
+}
+# memory — у пам'яті процесу; redis — спільний стан для всіх воркерів (RATE_LIMIT_REDIS_URL)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# Скільки ключів тримає memory-бекенд; найдавніші витісняються (ротація IP не з'їсть пам'ять)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Проксі, яким довіряємо X-Forwarded-For: IP чи мережі через кому, "*" — будь-який прямий
+# співрозмовник (один балансувальник попереду, як на Render). Порожньо — заголовок ігнорується,
+# і за проксі всі ділили б його IP; або ж uvicorn --proxy-headers --forwarded-allow-ips
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+@dataclass(frozen=True)
+class Rule:
+    capacity: int
+    per_seconds: float
+
+    @classmethod
+    def parse(cls, value: str):
+        if not value or value.strip() == "0":
+            return None
+        count, seconds = value.split("/")
+        return cls(int(count), float(seconds))
+
+    @property
+    def rate(self):
+        return self.capacity / self.per_seconds
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # ключ -> (токени, час оновлення)
+
+    async def take(self, key: str, rule: Rule):
+        # Повертає (дозволено, секунд до наступного токена)
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (rule.capacity, now))
+        tokens = min(rule.capacity, tokens + (now - updated) * rule.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rule.rate
+
+    def size(self):
+        return len(self.buckets)
+
+    async def close(self):
+        pass
+
+
+# Той самий алгоритм атомарно на боці Redis; час — з сервера Redis, а не воркерів
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBackend:
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        if aioredis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis потребує пакет redis (pip install redis)")
+        self.client = aioredis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.errors = 0
+
+    async def take(self, key: str, rule: Rule):
+        try:
+            allowed, tokens = await self.script(keys=[key], args=[rule.capacity, rule.rate])
+        except Exception as e:
+            # Недоступний Redis не повинен блокувати вхід — пропускаємо запит
+            self.errors += 1
+            print(f"❌ Rate limiter: Redis недоступний ({e})")
+            return True, 0.0
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / rule.rate
+
+    def size(self):
+        return None
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def build_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+class RateLimiter:
+    def __init__(self, backend, rules: dict = RATE_LIMIT_RULES, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.rules = {name: Rule.parse(value) for name, value in rules.items()}
+        self.enabled = enabled
+        self.allowed = Counter()
+        self.rejected = Counter()
+
+    async def check(self, action: str, **keys):
+        # check("login", ip=..., user=...): кидає RateLimited, якщо вичерпано будь-який кошик
+        if not self.enabled:
+            return
+        for kind, value in keys.items():
+            name = f"{action}:{kind}"
+            rule = self.rules.get(name)
+            if rule is None or not value:
+                continue
+            allowed, retry_after = await self.backend.take(f"ratelimit:{name}:{value}", rule)
+            if not allowed:
+                self.rejected[name] += 1
+                raise RateLimited(retry_after)
+        self.allowed[action] += 1
+
+    def stats(self):
+        stats = {
+            "allowed": dict(self.allowed),
+            "rejected": {name: self.rejected[name] for name in self.rules},
+        }
+        if self.backend.size() is not None:
+            stats["keys"] = self.backend.size()
+        if hasattr(self.backend, "errors"):
+            stats["backend_errors"] = self.backend.errors
+        return stats
+
+    async def close(self):
+        await self.backend.close()
+
+
+def parse_trusted_proxies(value: str):
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip() and part.strip() != "*"]
+
+TRUSTED_PROXY_NETWORKS = parse_trusted_proxies(RATE_LIMIT_TRUSTED_PROXIES)
+TRUST_ANY_PROXY = "*" in RATE_LIMIT_TRUSTED_PROXIES
+
+
+def is_trusted_proxy(address: str):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXY_NETWORKS)
+
+
+def client_ip(request):
+    # Без довірених проксі — лише адреса з'єднання (uvicorn з --proxy-headers вже підставив туди клієнта)
+    peer = request.client.host if request.client else ""
+    if not (TRUST_ANY_PROXY or is_trusted_proxy(peer)):
+        return peer
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if TRUST_ANY_PROXY:
+        # Балансувальник дописує адресу клієнта в кінець; ліві значення підробляються клієнтом
+        return forwarded[-1] if forwarded else peer
+    # Ідемо справа наліво повз власні проксі: перша чужа адреса — клієнт
+    for hop in reversed(forwarded):
+        if not is_trusted_proxy(hop):
+            return hop
+    return forwarded[0] if forwarded else peer
+
+
+rate_limiter = RateLimiter(build_backend())
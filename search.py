@@ -0,0 +1,65 @@
+import os
+from sqlalchemy import select, text, func, or_, column, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import ItemDB
+
+# Пошук по назві та автору. Postgres: ILIKE по триграмних GIN-індексах і ранжування
+# similarity(). SQLite: FTS5-таблиця items_search (див. міграцію 0003) з bm25.
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "50"))
+# Триграмний індекс не допомагає запитам, коротшим за три символи
+MIN_INDEXED_QUERY = 3
+
+
+def _dialect(db: AsyncSession):
+    return db.bind.dialect.name
+
+def _like_pattern(q: str):
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _fts_phrase(q: str):
+    # Весь запит — одна фраза: користувацький ввід не стає синтаксисом FTS5
+    return '"' + q.replace('"', '""') + '"'
+
+def _uses_fts(db: AsyncSession, q: str):
+    return _dialect(db) == "sqlite" and len(q) >= MIN_INDEXED_QUERY
+
+
+def _like_condition(q: str):
+    pattern = _like_pattern(q)
+    return or_(ItemDB.title.ilike(pattern, escape="\\"), ItemDB.author.ilike(pattern, escape="\\"))
+
+def _fts_ids(owner_id: int, q: str):
+    return text(
+        "SELECT rowid FROM items_search WHERE items_search MATCH :phrase AND owner_id = :owner_id"
+    ).bindparams(phrase=_fts_phrase(q), owner_id=owner_id).columns(column("rowid", Integer))
+
+
+def search_condition(db: AsyncSession, owner_id: int, q: str):
+    # Умова WHERE для списку категорії (/catalog/films?q=...)
+    if _uses_fts(db, q):
+        return ItemDB.id.in_(_fts_ids(owner_id, q))
+    return _like_condition(q)
+
+
+async def search_items(db: AsyncSession, owner_id: int, q: str, limit: int = SEARCH_LIMIT):
+    # Ранжовані збіги по всіх категоріях користувача
+    if _uses_fts(db, q):
+        return await _search_fts(db, owner_id, q, limit)
+    if _dialect(db) == "postgresql":
+        score = func.greatest(func.similarity(ItemDB.title, q), func.similarity(ItemDB.author, q))
+    else:
+        score = ItemDB.rating
+    query = select(ItemDB).where(ItemDB.owner_id == owner_id, _like_condition(q)).order_by(score.desc()).limit(limit)
+    return (await db.scalars(query)).all()
+
+
+async def _search_fts(db: AsyncSession, owner_id: int, q: str, limit: int):
+    ranked_ids = (await db.execute(
+        text("SELECT rowid FROM items_search WHERE items_search MATCH :phrase AND owner_id = :owner_id ORDER BY bm25(items_search) LIMIT :limit")
+        .bindparams(phrase=_fts_phrase(q), owner_id=owner_id, limit=limit).columns(column("rowid", Integer))
+    )).scalars().all()
+    # Менший bm25 — кращий збіг; порядок беремо з індексу, самі записи — по первинному ключу
+    rank = {item_id: position for position, item_id in enumerate(ranked_ids)}
+    items = (await db.scalars(select(ItemDB).where(ItemDB.id.in_(ranked_ids), ItemDB.owner_id == owner_id))).all()
+    return sorted(items, key=lambda item: rank[item.id])
@@ -0,0 +1,116 @@
+import os
+import gzip
+import stat
+import hashlib
+import mimetypes
+import anyio
+from urllib.parse import parse_qsl
+from starlette.datastructures import Headers
+from starlette.responses import Response, FileResponse
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli необов'язковий — тоді віддаємо лише gzip
+    brotli = None
+
+# Статика з довгим кешуванням: URL містить хеш вмісту (?v=...), тож браузер
+# може тримати файл рік і не перепитувати. Без хешу — сильний ETag і 304.
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+COMPRESSIBLE_TYPES = {"text/css", "text/javascript", "application/javascript", "application/json", "image/svg+xml", "text/plain", "text/html"}
+# Дрібні файли стискати немає сенсу: заголовки з'їдять виграш
+MIN_COMPRESS_SIZE = 1024
+
+
+class Asset:
+    def __init__(self, digest: str, media_type: str, variants: dict):
+        self.digest = digest
+        self.media_type = media_type
+        self.variants = variants
+
+
+def _build_asset(full_path: str):
+    with open(full_path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    variants = {}
+    if media_type in COMPRESSIBLE_TYPES and len(content) >= MIN_COMPRESS_SIZE:
+        variants["gzip"] = gzip.compress(content, compresslevel=9, mtime=0)
+        if brotli:
+            variants["br"] = brotli.compress(content, quality=11)
+    return Asset(digest, media_type, variants)
+
+
+def _choose_encoding(accept_encoding: str, variants: dict):
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in variants and encoding in accepted:
+            return encoding
+    return None
+
+
+class HashedStaticFiles(StaticFiles):
+    def __init__(self, *args, url_prefix: str = "/static", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.url_prefix = url_prefix
+        # full_path -> (mtime_ns, size, Asset); перераховується лише якщо файл змінився
+        self.assets = {}
+
+    def _asset(self, full_path: str, stat_result: os.stat_result):
+        key = (stat_result.st_mtime_ns, stat_result.st_size)
+        cached = self.assets.get(full_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        asset = _build_asset(full_path)
+        self.assets[full_path] = (key, asset)
+        return asset
+
+    def warm(self):
+        # Хеші та стиснені варіанти будуються один раз при старті, а не на першому запиті.
+        # Ключ — шлях від lookup_path, як у url() і get_response(); uploads/ пропускаємо:
+        # імена аватарок уже містять хеш вмісту, а читати їх усі на кожному старті дарма
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [name for name in dirs if not name.startswith(".") and os.path.join(root, name) != os.path.join(self.directory, "uploads")]
+            for name in files:
+                if not name.startswith("."):
+                    full_path, stat_result = self.lookup_path(os.path.relpath(os.path.join(root, name), self.directory))
+                    if stat_result and stat.S_ISREG(stat_result.st_mode):
+                        self._asset(full_path, stat_result)
+        return len(self.assets)
+
+    def url(self, path: str):
+        # Jinja-хелпер: static_url("style.css") або static_url("/static/uploads/a.webp")
+        if path.startswith(self.url_prefix + "/"):
+            path = path[len(self.url_prefix) + 1:]
+        full_path, stat_result = self.lookup_path(path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            return f"{self.url_prefix}/{path}"
+        return f"{self.url_prefix}/{path}?v={self._asset(full_path, stat_result).digest}"
+
+    async def get_response(self, path: str, scope):
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode) or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        asset = await anyio.to_thread.run_sync(self._asset, full_path, stat_result)
+        request_headers = Headers(scope=scope)
+        encoding = _choose_encoding(request_headers.get("accept-encoding", ""), asset.variants) if scope["method"] == "GET" else None
+        # Сильний ETag — окремий для кожного кодування, бо байти різні
+        etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+        version = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))).get("v")
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if version == asset.digest else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request_headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return Response(asset.variants[encoding], media_type=asset.media_type, headers=headers)
+        return FileResponse(full_path, stat_result=stat_result, media_type=asset.media_type, headers=headers)
+
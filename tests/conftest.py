@@ -0,0 +1,45 @@
+import os
+import sys
+import uuid
+import tempfile
+import pytest
+
+# Модулі додатку читають налаштування з оточення під час імпорту. База — файл, а не
+# sqlite:// у пам'яті: синхронний і асинхронний рушії мають бачити ту саму схему.
+TEST_DIR = tempfile.mkdtemp(prefix="globify-tests-")
+os.environ.setdefault("DB_URL", f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("COVER_CACHE_DIR", os.path.join(TEST_DIR, "covers"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def login(client):
+    # Створює підтвердженого користувача напряму в БД і входить під ним
+    from database import SessionLocal
+    from models import UserDB
+    from passwords import pwd_context
+
+    def login_as(username: str = None):
+        username = username or f"user_{uuid.uuid4().hex[:8]}"
+        with SessionLocal() as db:
+            user = UserDB(username=username, email=f"{username}@example.com", hashed_password=pwd_context.hash("secret"), is_verified=True, verify_token="")
+            db.add(user)
+            db.commit()
+            user_id = user.id
+        client.cookies.clear()
+        response = client.post("/login", data={"username": username, "password": "secret"}, follow_redirects=False)
+        assert response.status_code == 303
+        return user_id
+
+    return login_as
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import select
+from database import SessionLocal
+from models import ItemDB
+
+JSON = {"Accept": "application/json"}
+
+
+def add_books(client, count: int):
+    for number in range(count):
+        client.post("/catalog/books/add", data={"title": f"Книга {number}", "author": "a", "rating": "5"}, follow_redirects=False)
+
+
+def owned_items(user_id: int):
+    with SessionLocal() as db:
+        return db.scalars(select(ItemDB).where(ItemDB.owner_id == user_id).order_by(ItemDB.id)).all()
+
+
+@pytest.mark.parametrize("ids", ["15", [2.9, True], [True], ["1.5"], [-1], None, {"1": 1}, [2 ** 40]])
+def test_delete_rejects_malformed_ids(client, login, ids):
+    user_id = login()
+    add_books(client, 2)
+    response = client.post("/catalog/books/batch/delete", json={"ids": ids}, headers=JSON)
+    assert response.status_code == 400
+    assert len(owned_items(user_id)) == 2
+
+
+def test_delete_only_touches_own_items(client, login):
+    other_id = login()
+    add_books(client, 1)
+    user_id = login()
+    add_books(client, 3)
+    mine = [item.id for item in owned_items(user_id)]
+    foreign = owned_items(other_id)[0].id
+    response = client.post("/catalog/books/batch/delete", json={"ids": [mine[0], mine[1], foreign]}, headers=JSON)
+    assert response.json() == {"deleted": mine[:2]}
+    assert [item.id for item in owned_items(user_id)] == mine[2:]
+    assert len(owned_items(other_id)) == 1
+
+
+def test_share_accepts_form_checkboxes(client, login):
+    user_id = login()
+    add_books(client, 2)
+    ids = [str(item.id) for item in owned_items(user_id)]
+    response = client.post("/catalog/books/batch/share", data={"ids": ids}, headers=JSON)
+    assert response.json()["updated"] == sorted(map(int, ids))
+    assert all(item.is_shared for item in owned_items(user_id))
+
+
+def test_rating_is_validated(client, login):
+    user_id = login()
+    add_books(client, 1)
+    item_id = owned_items(user_id)[0].id
+    for rating in ("nan", 11, "abc"):
+        response = client.post("/catalog/books/batch/rating", json={"ids": [item_id], "rating": rating}, headers=JSON)
+        assert response.status_code == 400
+    response = client.post("/catalog/books/batch/rating", json={"ids": [item_id], "rating": 9}, headers=JSON)
+    assert response.json() == {"updated": [item_id], "rating": 9.0}
+    assert owned_items(user_id)[0].rating == 9
@@ -0,0 +1,35 @@
+import io
+from bulk import _read_records, validate_record
+
+
+def read(text: str, file_format: str):
+    return list(_read_records(io.StringIO(text, newline=""), file_format))
+
+
+def test_non_string_category_is_a_row_error():
+    (line, record), = read('{"category": 5, "title": "t", "author": "a", "rating": 5}\n', "jsonl")
+    try:
+        validate_record(record, owner_id=1)
+    except ValueError as e:
+        assert "5" in str(e)
+    else:
+        raise AssertionError("очікувалась помилка валідації")
+
+
+def test_oversized_csv_field_stops_with_error():
+    text = "category,title,author,rating\nfilms,ok,a,5\nfilms," + "x" * 200_000 + ",a,5\nfilms,after,a,5\n"
+    records = read(text, "csv")
+    assert records[0][1]["title"] == "ok"
+    assert isinstance(records[-1][1], ValueError)
+    assert len(records) == 2
+
+
+def test_nul_byte_in_csv_is_reported():
+    # Залежно від версії Python NUL відхиляє csv-модуль або валідація рядка
+    (line, record), = read("category,title,author,rating\nfilms,t\0,a,5\n", "csv")
+    if not isinstance(record, ValueError):
+        try:
+            validate_record(record, owner_id=1)
+        except ValueError:
+            return
+        raise AssertionError("очікувалась помилка валідації")
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import select
+from database import SessionLocal
+from models import ItemDB
+
+
+def owned_items(user_id: int):
+    with SessionLocal() as db:
+        return db.scalars(select(ItemDB).where(ItemDB.owner_id == user_id).order_by(ItemDB.id)).all()
+
+
+def add_film(client, rating, title: str = "Фільм"):
+    return client.post("/catalog/films/add", data={"title": title, "author": "Режисер", "rating": rating}, follow_redirects=False)
+
+
+@pytest.mark.parametrize("rating", ["nan", "inf", "-inf", "500", "0"])
+def test_add_rejects_bad_rating(client, login, rating):
+    user_id = login()
+    assert add_film(client, rating).status_code == 400
+    assert owned_items(user_id) == []
+
+
+@pytest.mark.parametrize("rating", ["nan", "inf", "500"])
+def test_edit_rejects_bad_rating(client, login, rating):
+    user_id = login()
+    assert add_film(client, "7").status_code == 303
+    item, = owned_items(user_id)
+    response = client.post(f"/catalog/films/{item.id}/edit", data={"title": "Фільм", "author": "Режисер", "rating": rating}, follow_redirects=False)
+    assert response.status_code == 400
+    assert owned_items(user_id)[0].rating == 7
+
+
+def test_feed_survives_bad_rating_attempt(client, login):
+    # Регресія: поширений запис з rating=nan ламав / і /feed/films для всіх інших
+    author_id = login()
+    assert add_film(client, "nan", title="Зламаний").status_code == 400
+    assert add_film(client, "8", title="Звичайний").status_code == 303
+    item, = owned_items(author_id)
+    client.get(f"/catalog/films/{item.id}/share", follow_redirects=False)
+    login()
+    assert client.get("/").status_code == 200
+    feed = client.get("/feed/films")
+    assert feed.status_code == 200
+    assert "Звичайний" in feed.text and "Зламаний" not in feed.text
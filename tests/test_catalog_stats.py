@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine, insert, update, select
+from migrations import init_schema
+from models import UserDB, ItemDB, CatalogStatsDB
+from catalog_stats import reconcile_catalog_stats
+
+
+def make_engine():
+    engine = create_engine("sqlite://")
+    init_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserDB), [{"id": 1, "username": "a", "email": "a@x", "hashed_password": "-"}, {"id": 2, "username": "b", "email": "b@x", "hashed_password": "-"}])
+        conn.execute(insert(ItemDB), [
+            {"category": "films", "title": "t", "author": "a", "rating": 5, "owner_id": 1, "is_shared": True},
+            {"category": "films", "title": "t", "author": "a", "rating": 5, "owner_id": 1, "is_shared": False},
+            {"category": "books", "title": "t", "author": "a", "rating": 5, "owner_id": 2, "is_shared": False},
+        ])
+    return engine
+
+
+def test_reconcile_repairs_drift_and_missing_rows():
+    engine = make_engine()
+    with engine.begin() as conn:
+        assert reconcile_catalog_stats(conn) == 2  # рядків статистики ще не було
+        conn.execute(update(CatalogStatsDB).where(CatalogStatsDB.owner_id == 1).values(films_count=7, version=3))
+        assert reconcile_catalog_stats(conn) == 1
+        assert reconcile_catalog_stats(conn) == 0
+        stats = {row.owner_id: row for row in conn.execute(select(CatalogStatsDB))}
+    assert (stats[1].films_count, stats[1].films_shared, stats[1].version) == (2, 1, 3)
+    assert (stats[2].books_count, stats[2].films_count) == (1, 0)
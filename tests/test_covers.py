@@ -0,0 +1,109 @@
+import os
+import asyncio
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import pytest
+from PIL import Image
+import covers
+from covers import CoverCache, CoverService, CoverRejected, check_public_url, cover_key, cover_url
+
+
+class RecordingHandler(SimpleHTTPRequestHandler):
+    # Локальна заміна стороннього сайту: запам'ятовує шлях і заголовок Host кожного запиту
+    requests = []
+
+    def log_message(self, *args):
+        self.requests.append((self.path, self.headers["Host"]))
+
+
+@pytest.fixture
+def origin(tmp_path, monkeypatch):
+    Image.new("RGB", (800, 600), "orange").save(tmp_path / "cover.jpg")
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+    RecordingHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RecordingHandler, directory=str(tmp_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(covers, "COVER_ALLOW_PRIVATE", True)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(cache: CoverCache, url: str):
+    async def scenario():
+        cache.load()
+        service = CoverService(cache)
+        service.start()
+        try:
+            return await service.request(cover_key(url), url)
+        finally:
+            await service.stop()
+    return asyncio.run(scenario())
+
+
+def test_builds_thumbnails(origin, tmp_path):
+    cache = CoverCache(str(tmp_path / "cache"), 10 ** 7)
+    url = f"{origin}/cover.jpg"
+    assert fetch(cache, url) is True
+    for size, edge in covers.COVER_SIZES.items():
+        with Image.open(cache.lookup(cover_key(url), size)) as image:
+            assert max(image.size) == edge
+
+
+def test_broken_image_is_not_cached(origin, tmp_path):
+    cache = CoverCache(str(tmp_path / "cache"), 10 ** 7)
+    assert fetch(cache, f"{origin}/broken.jpg") is False
+    assert cache.entries == {}
+    assert os.listdir(cache.directory) == []
+
+
+def test_private_address_is_rejected(origin, monkeypatch):
+    monkeypatch.setattr(covers, "COVER_ALLOW_PRIVATE", False)
+    for url in (f"{origin}/cover.jpg", "http://localhost/cover.jpg", "ftp://example.com/cover.jpg"):
+        with pytest.raises(CoverRejected):
+            asyncio.run(check_public_url(url))
+
+
+def test_connects_to_the_checked_address(origin, tmp_path, monkeypatch):
+    # Ім'я розв'язується рівно раз: httpx отримує перевірену IP-адресу, а не ім'я (DNS rebinding)
+    resolved = []
+
+    async def resolve(hostname, port):
+        resolved.append(hostname)
+        return ["127.0.0.1"]
+
+    monkeypatch.setattr(covers, "resolve", resolve)
+    port = origin.rsplit(":", 1)[1]
+    cache = CoverCache(str(tmp_path / "cache"), 10 ** 7)
+    assert fetch(cache, f"http://covers.invalid:{port}/cover.jpg") is True
+    assert resolved == ["covers.invalid"]
+    assert RecordingHandler.requests == [("/cover.jpg", f"covers.invalid:{port}")]
+
+
+def test_size_limit_covers_the_shared_directory(tmp_path):
+    # Два воркери з тим самим каталогом: ліміт — на каталог, а не на кожен процес
+    directory = str(tmp_path / "cache")
+    first, second = CoverCache(directory, 2500), CoverCache(directory, 2500)
+    first.load()
+    second.load()
+    for cache, keys in ((first, "ab"), (second, "cd")):
+        for key in keys:
+            os.makedirs(cache.key_dir(key))
+            with open(os.path.join(cache.key_dir(key), "sm.webp"), "wb") as file:
+                file.write(b"x" * 1000)
+            cache.add(key, 1000)
+    second.apply(second.scan(), 0)
+    on_disk = sum(os.path.getsize(os.path.join(directory, key, "sm.webp")) for key in os.listdir(directory))
+    assert on_disk <= 2500
+    assert second.total_bytes == on_disk
+
+
+def test_cover_route_serves_webp(client, origin, monkeypatch):
+    monkeypatch.setattr(covers, "COVER_WAIT_TIMEOUT", 30)
+    response = client.get(cover_url(f"{origin}/cover.jpg"), follow_redirects=False)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    # Підпис ключа обов'язковий — інакше /covers/ був би відкритим проксі
+    forged = client.get(f"/covers/sm/{'0' * 32}.webp?u={origin}/cover.jpg", follow_redirects=False)
+    assert forged.status_code == 404
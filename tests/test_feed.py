@@ -0,0 +1,20 @@
+from database import SessionLocal
+from models import ItemDB
+from feed_cache import feed_cache
+
+
+def test_shared_item_without_rating_is_skipped(client, login):
+    # Рядки до міграції можуть мати rating = NULL: сортування та курсор на них падали
+    author_id = login()
+    with SessionLocal() as db:
+        db.add_all([
+            ItemDB(category="books", title="Без оцінки", author="a", rating=None, owner_id=author_id, is_shared=True),
+            ItemDB(category="books", title="З оцінкою", author="a", rating=6, owner_id=author_id, is_shared=True),
+        ])
+        db.commit()
+    feed_cache.clear()
+    login()
+    assert client.get("/").status_code == 200
+    feed = client.get("/feed/books")
+    assert feed.status_code == 200
+    assert "З оцінкою" in feed.text and "Без оцінки" not in feed.text
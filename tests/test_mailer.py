@@ -0,0 +1,159 @@
+import socket
+import smtplib
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import mailer
+from mailer import ReusableSMTP, MailWorker, enqueue_email
+from migrations import init_schema
+from models import OutboxEmailDB
+
+
+class RecordingHandler:
+    # Локальний SMTP-сервер: bad@ — постійна відмова 550, busy@ — тимчасова 451
+    def __init__(self):
+        self.connections = 0
+        self.rcpt_attempts = 0
+        self.delivered = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        self.rcpt_attempts += 1
+        if address.startswith("bad@"):
+            return "550 5.1.1 Mailbox does not exist"
+        if address.startswith("busy@"):
+            return "451 4.3.0 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(monkeypatch, handler, password=None, **smtp_options):
+    handler.controller = Controller(handler, hostname="127.0.0.1", port=free_port(), **smtp_options)
+    handler.controller.start()
+    monkeypatch.setattr(mailer, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(mailer, "SMTP_PORT", handler.controller.port)
+    monkeypatch.setattr(mailer, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(mailer, "SENDER_PASSWORD", password)
+    monkeypatch.setattr(mailer, "SENDER_EMAIL", "noreply@example.com")
+    return handler
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = start_server(monkeypatch, RecordingHandler())
+    yield handler
+    handler.controller.stop()
+
+
+@pytest.fixture
+def rejecting_login_server(monkeypatch):
+    # Сервер, що відхиляє будь-який пароль (535), як після зміни EMAIL_PASSWORD
+    def reject(server, session, envelope, mechanism, auth_data):
+        return AuthResult(success=False, handled=False)
+    handler = start_server(monkeypatch, RecordingHandler(), password="wrong", authenticator=reject, auth_require_tls=False)
+    yield handler
+    handler.controller.stop()
+
+
+def make_email(recipient: str):
+    return OutboxEmailDB(recipient=recipient, subject="Тест", html="<p>Привіт</p>", status="pending", attempts=0)
+
+
+def test_reuses_one_connection(smtp_server):
+    smtp = ReusableSMTP()
+    smtp.send("one@example.com", "Тест", "<p>1</p>")
+    smtp.send("two@example.com", "Тест", "<p>2</p>")
+    smtp.close()
+    assert smtp_server.delivered == ["one@example.com", "two@example.com"]
+    assert smtp_server.connections == 1
+
+
+def test_recipient_refusal_is_not_resent(smtp_server):
+    smtp = ReusableSMTP()
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        smtp.send("bad@example.com", "Тест", "<p>1</p>")
+    assert smtp_server.rcpt_attempts == 1
+    # Після відмови з'єднання лишається придатним для наступних листів
+    smtp.send("good@example.com", "Тест", "<p>2</p>")
+    smtp.close()
+    assert smtp_server.delivered == ["good@example.com"]
+    assert smtp_server.connections == 1
+
+
+def test_dropped_connection_is_reopened(smtp_server):
+    smtp = ReusableSMTP()
+    smtp.send("one@example.com", "Тест", "<p>1</p>")
+    # Перезапуск сервера рве відкрите з'єднання
+    handler = smtp_server.controller.handler
+    smtp_server.controller.stop()
+    smtp_server.controller = Controller(handler, hostname="127.0.0.1", port=smtp_server.controller.port)
+    smtp_server.controller.start()
+    smtp.send("two@example.com", "Тест", "<p>2</p>")
+    smtp.close()
+    assert smtp_server.delivered == ["one@example.com", "two@example.com"]
+    assert smtp_server.connections == 2
+
+
+def test_permanent_failure_goes_dead_at_once(smtp_server):
+    worker = MailWorker()
+    email = make_email("bad@example.com")
+    worker._deliver(email)
+    worker.smtp.close()
+    assert email.status == "dead"
+    assert email.attempts == 1
+    assert smtp_server.rcpt_attempts == 1
+    assert worker.dead == 1
+
+
+def test_temporary_failure_is_retried_later(smtp_server):
+    worker = MailWorker()
+    email = make_email("busy@example.com")
+    worker._deliver(email)
+    worker.smtp.close()
+    assert email.status == "pending"
+    assert email.next_attempt_at is not None
+    assert worker.failed == 1
+
+
+def test_sent_email_is_marked(smtp_server):
+    worker = MailWorker()
+    email = make_email("ok@example.com")
+    worker._deliver(email)
+    worker.smtp.close()
+    assert email.status == "sent"
+    assert smtp_server.delivered == ["ok@example.com"]
+
+
+def test_login_failure_keeps_the_queue(rejecting_login_server):
+    engine = create_engine("sqlite://")
+    init_schema(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        for recipient in ("one@example.com", "two@example.com", "three@example.com"):
+            enqueue_email(db, recipient, "Тест", "<p>1</p>")
+        db.commit()
+    worker = MailWorker(session_factory=session_factory)
+    worker.process_batch()
+    with session_factory() as db:
+        emails = db.query(OutboxEmailDB).all()
+    # Помилка входу — не вина листа: нічого не списано, пачка зупинилась на першій спробі
+    assert [email.status for email in emails] == ["pending"] * 3
+    assert [email.attempts for email in emails] == [0] * 3
+    assert rejecting_login_server.connections == 1
+    assert worker.server_down == 1 and worker.dead == 0
@@ -0,0 +1,16 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from observability import instrument_engine
+
+
+def test_failed_statement_leaves_no_start_mark():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+        assert "query_started" not in conn.info
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert "query_started" not in conn.info
@@ -0,0 +1,27 @@
+import ipaddress
+from types import SimpleNamespace
+import ratelimit
+from ratelimit import client_ip
+
+
+def make_request(peer: str, forwarded: str = None):
+    headers = {"x-forwarded-for": forwarded} if forwarded else {}
+    return SimpleNamespace(client=SimpleNamespace(host=peer), headers=headers)
+
+
+def test_forwarded_header_is_ignored_by_default():
+    assert client_ip(make_request("10.0.0.5", "1.2.3.4")) == "10.0.0.5"
+
+
+def test_trusted_proxy_chain(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUSTED_PROXY_NETWORKS", [ipaddress.ip_network("10.0.0.0/8")])
+    # Ліве значення підробив клієнт, праве дописав наш проксі 10.0.0.7
+    assert client_ip(make_request("10.0.0.5", "6.6.6.6, 1.2.3.4, 10.0.0.7")) == "1.2.3.4"
+    assert client_ip(make_request("10.0.0.5")) == "10.0.0.5"
+    # Чужий співрозмовник заголовком не керує
+    assert client_ip(make_request("8.8.8.8", "1.2.3.4")) == "8.8.8.8"
+
+
+def test_any_direct_proxy(monkeypatch):
+    monkeypatch.setattr(ratelimit, "TRUST_ANY_PROXY", True)
+    assert client_ip(make_request("172.16.0.1", "6.6.6.6, 1.2.3.4")) == "1.2.3.4"
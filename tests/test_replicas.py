@@ -0,0 +1,50 @@
+import sqlite3
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+import database
+
+
+@pytest.fixture
+def replica(monkeypatch, tmp_path):
+    # Друга БД-"репліка": знімок основної на момент виклику sync(), далі вона відстає
+    path = tmp_path / "replica.db"
+
+    def sync():
+        with sqlite3.connect(database.engine.url.database) as source, sqlite3.connect(path) as target:
+            source.backup(target)
+
+    sync()
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    state = SimpleNamespace(sync=sync, queries=0)
+
+    @event.listens_for(replica_engine.sync_engine, "before_cursor_execute")
+    def count(*args):
+        state.queries += 1
+
+    monkeypatch.setattr(database, "replica_engines", [replica_engine])
+    monkeypatch.setattr(database, "DB_REPLICA_STICKY_SECONDS", 0)
+    return state
+
+def test_new_user_is_not_logged_out_by_lagging_replica(client, login, replica):
+    # Користувача ще немає на репліці: перевірка на основній БД замість розлогінення
+    login()
+    profile = client.get("/profile", follow_redirects=False)
+    assert profile.status_code == 200
+    assert replica.queries > 0
+    assert client.get("/profile", follow_redirects=False).status_code == 200
+
+
+def test_reads_follow_own_writes(client, login, replica, monkeypatch):
+    login()
+    replica.sync()
+    monkeypatch.setattr(database, "DB_REPLICA_STICKY_SECONDS", 60)
+    client.post("/catalog/music/add", data={"title": "Свіжий запис", "author": "a", "rating": "7"})
+    # Щойно записане читається з основної БД, хоч репліка його ще не має
+    assert "Свіжий запис" in client.get("/catalog/music").text
+    monkeypatch.setattr(database, "DB_REPLICA_STICKY_SECONDS", 0)
+    queries = replica.queries
+    assert "Свіжий запис" not in client.get("/catalog/music").text
+    assert replica.queries > queries
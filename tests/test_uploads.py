@@ -0,0 +1,31 @@
+import os
+import time
+import asyncio
+from sqlalchemy import create_engine, insert
+from migrations import init_schema
+from models import UserDB
+from uploads import UPLOAD_DIR, sweep_periodically
+
+
+def test_periodic_sweep_removes_only_old_orphans(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(UPLOAD_DIR)
+    # Файл, а не sqlite:// — прибирання читає БД з іншого потоку
+    engine = create_engine(f"sqlite:///{tmp_path / 'sweep.db'}")
+    init_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserDB), [{"username": "a", "email": "a@x", "hashed_password": "-", "avatar_url": f"/{UPLOAD_DIR}/used.webp"}])
+    day_ago = time.time() - 86400
+    for name, mtime in (("used.webp", day_ago), ("orphan.webp", day_ago), ("fresh.webp", None)):
+        path = os.path.join(UPLOAD_DIR, name)
+        open(path, "wb").close()
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    async def run_once():
+        sweeper = asyncio.create_task(sweep_periodically(engine, interval=0.01))
+        await asyncio.sleep(0.3)
+        sweeper.cancel()
+
+    asyncio.run(run_once())
+    assert sorted(os.listdir(UPLOAD_DIR)) == ["fresh.webp", "used.webp"]
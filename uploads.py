@@ -0,0 +1,185 @@
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import UploadFile, Request
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from models import UserDB
+
+# Аватарки: потокове збереження з лімітом розміру, дедуплікація за SHA-256
+# і стиснена квадратна WebP-мініатюра замість оригіналу на кілька мегабайт.
+UPLOAD_DIR = "static/uploads"
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_SIZE = int(os.getenv("AVATAR_SIZE", "256"))
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", "80"))
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "1"))
+# Файли без власника, молодші за це, не чіпаємо: їх може саме зберігати інший воркер
+AVATAR_ORPHAN_MIN_AGE = float(os.getenv("AVATAR_ORPHAN_MIN_AGE", "3600"))
+# Як часто процес додатку сам прибирає осиротілі файли (0 — лише вручну: python uploads.py)
+AVATAR_SWEEP_INTERVAL = float(os.getenv("AVATAR_SWEEP_INTERVAL", "3600"))
+# Понад сам файл форма несе поле bio і заголовки multipart; 1 МБ — як ліміт Starlette для полів
+AVATAR_FORM_OVERHEAD = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp"}
+
+
+class AvatarRejected(Exception):
+    pass
+
+
+_executor = None
+
+def _get_executor():
+    # Пул створюється ліниво, щоб імпорт модуля не форкав процеси
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=AVATAR_WORKERS)
+    return _executor
+
+async def run_image_job(function, *args):
+    # Декодування й ресайз зображень (аватарки, обкладинки) — у спільному пулі процесів
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), function, *args)
+
+def shutdown_executor():
+    global _executor
+    if _executor:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def make_thumbnail(source_path: str, target_path: str, size: int = AVATAR_SIZE, quality: int = AVATAR_QUALITY):
+    # Виконується в окремому процесі: декодування та ресайз — чистий CPU
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        partial_path = f"{target_path}.{uuid.uuid4().hex[:8]}.part"
+        thumbnail.save(partial_path, "WEBP", quality=quality, method=4)
+    os.replace(partial_path, target_path)
+
+
+def limited_form_request(request: Request):
+    # Ліміт на саме тіло запиту, а не на вже розібраний файл: Starlette спершу повністю
+    # записує multipart у тимчасовий файл, тож завеликий upload треба обривати до розбору.
+    # Content-Length відсікає одразу, лічильник у receive — chunked-запити без нього
+    limit = AVATAR_MAX_BYTES + AVATAR_FORM_OVERHEAD
+    error = f"Файл завеликий (максимум {AVATAR_MAX_BYTES // 1024} КБ)"
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise AvatarRejected(error)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        received += len(message.get("body", b""))
+        if received > limit:
+            raise AvatarRejected(error)
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def _stream_to_disk(upload: UploadFile, path: str):
+    digest = hashlib.sha256()
+    written = 0
+    with open(path, "wb") as buffer:
+        while chunk := await upload.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > AVATAR_MAX_BYTES:
+                raise AvatarRejected(f"Файл завеликий (максимум {AVATAR_MAX_BYTES // 1024} КБ)")
+            digest.update(chunk)
+            await asyncio.to_thread(buffer.write, chunk)
+    return digest.hexdigest()
+
+
+async def save_avatar(upload: UploadFile):
+    # Повертає URL мініатюри; однакові файли дають той самий URL і зберігаються один раз
+    file_extension = upload.filename.split(".")[-1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise AvatarRejected("Можна завантажувати тільки картинки (.jpg, .png, .webp)")
+
+    temp_path = os.path.join(UPLOAD_DIR, f".upload_{uuid.uuid4().hex}")
+    try:
+        content_hash = await _stream_to_disk(upload, temp_path)
+        target_path = os.path.join(UPLOAD_DIR, f"avatar_{content_hash[:32]}.webp")
+        try:
+            # Той самий файл уже є — оновлюємо mtime, щоб remove_avatar_if_unused
+            # іншого користувача не видалив його як щойно звільнений
+            await asyncio.to_thread(os.utime, target_path)
+        except FileNotFoundError:
+            try:
+                await run_image_job(make_thumbnail, temp_path, target_path)
+            except Exception:
+                raise AvatarRejected("Файл пошкоджений або це не зображення")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return f"/{target_path}"
+
+
+def _local_path(avatar_url: str):
+    if avatar_url and avatar_url.startswith(f"/{UPLOAD_DIR}/"):
+        return avatar_url[1:]
+    return None
+
+def _remove_if_stale(path: str):
+    try:
+        if time.time() - os.path.getmtime(path) >= AVATAR_ORPHAN_MIN_AGE:
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def remove_avatar_if_unused(avatar_url: str, references: int):
+    # references — скільки користувачів досі посилаються на цей файл (після оновлення).
+    # Свіжі файли не чіпаємо: їх міг щойно отримати інший користувач через дедуплікацію,
+    # а його commit ще не видно в references; такі прибере sweep_orphan_avatars
+    path = _local_path(avatar_url)
+    if path and references == 0:
+        await asyncio.to_thread(_remove_if_stale, path)
+
+
+def sweep_orphan_avatars(referenced_urls):
+    # Прибирає файли, на які не посилається жоден користувач (старі аватарки, обірвані завантаження)
+    referenced = {_local_path(url) for url in referenced_urls}
+    now = time.time()
+    removed = 0
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        if path in referenced or not os.path.isfile(path):
+            continue
+        if now - os.path.getmtime(path) < AVATAR_ORPHAN_MIN_AGE:
+            continue
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def referenced_avatar_urls(bind):
+    with bind.connect() as conn:
+        return [url for (url,) in conn.execute(select(UserDB.avatar_url).where(UserDB.avatar_url != ""))]
+
+
+async def sweep_periodically(bind, interval: float = AVATAR_SWEEP_INTERVAL):
+    # Фонове завдання додатку, як звірка лічильників: запит і обхід каталогу — у потоці
+    def sweep():
+        return sweep_orphan_avatars(referenced_avatar_urls(bind))
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await asyncio.to_thread(sweep)
+            if removed:
+                print(f"🧹 Видалено осиротілих аватарок: {removed}")
+        except Exception as e:
+            print(f"❌ Помилка прибирання аватарок: {e}")
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    print(f"🧹 Видалено осиротілих аватарок: {sweep_orphan_avatars(referenced_avatar_urls(engine))}")
@@ -0,0 +1,76 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Кеш користувачів сесії в пам'яті процесу: TTL обмежує застарілість між воркерами,
+# LRU — обсяг пам'яті. Зміни профілю інвалідовують запис явно.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    # Лише поля, які потрібні маршрутам і шаблонам — без хешу пароля
+    id: int
+    username: str
+    email: str
+    is_verified: bool
+    avatar_url: str
+    bio: str
+
+    @classmethod
+    def from_model(cls, user):
+        return cls(user.id, user.username, user.email, bool(user.is_verified), user.avatar_url or "", user.bio or "")
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def remember_user(user):
+    return user_cache.set(user.id, CachedUser.from_model(user))